@@ -0,0 +1,69 @@
+import numpy as np
+import os as os
+import sys as sys
+
+from module import crystallo as cr
+from module import micromech as mm
+from module import store as st
+
+'''
+Input
+'''
+# Number of atoms/molecules in unit cell
+p = 2 # reference phase
+q = 1 # deformed phase
+
+# Unit cell parameters of the reference configuration
+abc_ref = np.array([15.7380, 9.2352, 15.7040])
+angle_ref = np.array([90, 109.1209, 90])
+
+# Unit cell parameters of the deformed configuration
+abc_def = np.array([12.8946, 9.4837, 9.3384])
+angle_def = np.array([90, 90, 90])
+
+# Experimental habit planes as miller indices of the reference configuration
+milfrac = np.array([[1, 0, 0],
+                    [0, 0, 1],
+                    [1, 0, 1],
+                    [1, 0, -1]])
+
+'''
+Calculation
+'''
+# Largest edge ratio, as in calc_distmin.py
+d = round(max(np.array([*abc_ref, *abc_def])) / min(np.array([*abc_ref, *abc_def])))
+
+# Loads every stored top k stretch tensor for the input parameters from calc_distmin.py
+table = st.queryStore(p=p, q=q, d=d, abc_ref=abc_ref, angle_ref=angle_ref, abc_def=abc_def, angle_def=angle_def)
+if table['id'].size == 0:
+    print('No stored results for the input parameters, run calc_distmin.py first')
+    sys.exit(1)
+results = st.loadStore(table['id'])
+U = np.concatenate([np.reshape(u, (-1, 3, 3)) for u in results['U']])
+dist = np.concatenate([np.ravel(dist) for dist in results['dist']])
+P = np.concatenate([np.concatenate([np.reshape(P_ref, (-1, 9)), np.reshape(P_def, (-1, 9))], axis=1)
+                    for P_ref, P_def in zip(results['P_ref'], results['P_def'])])
+
+# Drops the padding rows of searches with fewer than k pairs and the pairs found again by repeated runs
+_, first = np.unique(P, axis=0, return_index=True)
+keep = np.sort(first[dist[first] < 1e100])
+U = U[keep]
+dist = dist[keep]
+
+# Converts the habit planes to normal vectors in the Cartesian coordinate of the reference lattice
+reflat = cr.unit2vect(abc_ref, angle_ref)
+milvec = cr.mil2norm(milfrac, reflat)
+
+# Ranks the candidates by kinematic compatibility
+order, metrics = mm.rankcomp(U, milvec)
+
+'''
+Output
+'''
+print('Kinematic compatibility ranking')
+print('   rank   distance     |lam2-1|     |det U-1|    theta   habit plane')
+for rank, i in enumerate(order):
+    # Candidates without a habit plane (U = I) have no matching experimental plane
+    plane = milfrac[metrics['mil_idx'][i]] if metrics['mil_idx'][i] >= 0 else '-'
+    print(f'   {rank:<6} {dist[i]:<12.4e} {metrics["lam2_dev"][i]:<12.4e} {metrics["vol_dev"][i]:<12.4e} '
+          f'{metrics["theta"][i]:<7.2f} {plane}')
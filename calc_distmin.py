@@ -1,5 +1,6 @@
 import numpy as np
 import os as os
+import time as time
 
 from module import corrmat as cm
 from module import distmin as dm
@@ -20,24 +21,32 @@ angle_ref = np.array([90, 109.1209, 90])
 abc_def = np.array([12.8946, 9.4837, 9.3384])
 angle_def = np.array([90, 90, 90])
 
+# Number of minimum distance functions kept, enough to screen with calc_compat.py
+k = 1000
+
 '''
 Calculation
 '''
 # Largest edge ratio
 d = round(max(np.array([*abc_ref, *abc_def])) / min(np.array([*abc_ref, *abc_def])))
 
-# Generates correspondance matricies if it doesnt exist in file
-cm.saveCorMat(d)
+# Generates the bit packed correspondance matricies if they dont exist in file, from the int8 files if those exist
+timing = {}
+t0 = time.perf_counter()
+cm.saveCorMat(d, packed=True)
+timing['saveCorMat'] = time.perf_counter() - t0
 
 # Converts unit cell parameters (fractional coordinate) to lattice vectors (Cartesian coordinate)
 reflat = cr.unit2vect(abc_ref, angle_ref)
 deflat = cr.unit2vect(abc_def, angle_def)
 
-# Reads the correspondance matrix files
-file_path, ref_files, def_files = cm.readCorMat(d, p, q)
+# Reads the bit packed correspondance matrix files, which are unpacked while they are read
+file_path, ref_files, def_files = cm.readCorMat(d, p, q, packed=True)
 
-# Calculates the three minimum distance functions
-distFunc, U, P_ref, P_def = dm.loopDist(file_path, ref_files, def_files, reflat, deflat)
+# Calculates the k minimum distance functions
+t0 = time.perf_counter()
+distFunc, U, P_ref, P_def = dm.loopDist(file_path, ref_files, def_files, reflat, deflat, k)
+timing['loopDist'] = time.perf_counter() - t0
 
 # Calculates the new unit cell parameters
 abc_ref_new, abc_def_new, angle_ref_new, angle_def_new = dm.newLatt(reflat, deflat, P_ref[1,:,:], P_def[1,:,:])
@@ -46,7 +55,8 @@ abc_ref_new, abc_def_new, angle_ref_new, angle_def_new = dm.newLatt(reflat, defl
 Output
 '''
 # Saves the correspondance matrix, stretch tensor, distance function value, and unit cell parameters of the reduced parameters
-dm.saveDist(distFunc, U, P_ref, P_def, abc_ref_new, abc_def_new, angle_ref_new, angle_def_new)
+dm.saveDist(distFunc, U, P_ref, P_def, abc_ref_new, abc_def_new, angle_ref_new, angle_def_new,
+            p=p, q=q, d=d, latt_in=(abc_ref, angle_ref, abc_def, angle_def), timing=timing)
 
 
 
@@ -0,0 +1,47 @@
+import numpy as np
+import os as os
+import time as time
+
+from module import distmin as dm
+from module import crystallo as cr
+
+'''
+Input
+'''
+# Number of atoms/molecules in unit cell
+p = 2 # reference phase
+q = 1 # deformed phase
+
+# Unit cell parameters of the reference configuration
+abc_ref = np.array([15.7380, 9.2352, 15.7040])
+angle_ref = np.array([90, 109.1209, 90])
+
+# Unit cell parameters of the deformed configuration
+abc_def = np.array([12.8946, 9.4837, 9.3384])
+angle_def = np.array([90, 90, 90])
+
+# Largest d searched if the minimum is not certified before
+d_max = 3
+
+'''
+Calculation
+'''
+# Converts unit cell parameters (fractional coordinate) to lattice vectors (Cartesian coordinate)
+reflat = cr.unit2vect(abc_ref, angle_ref)
+deflat = cr.unit2vect(abc_def, angle_def)
+
+# Searches d = 1, 2, 3, ... until no larger d can beat the three minimum distance functions
+timing = {}
+t0 = time.perf_counter()
+distFunc, U, P_ref, P_def, d, certified = dm.deepDist(p, q, reflat, deflat, d_max=d_max)
+timing['deepDist'] = time.perf_counter() - t0
+
+# Calculates the new unit cell parameters
+abc_ref_new, abc_def_new, angle_ref_new, angle_def_new = dm.newLatt(reflat, deflat, P_ref, P_def)
+
+'''
+Output
+'''
+# Saves the correspondance matrix, stretch tensor, distance function value, and unit cell parameters of the reduced parameters
+dm.saveDist(distFunc, U, P_ref, P_def, abc_ref_new, abc_def_new, angle_ref_new, angle_def_new,
+            p=p, q=q, d=d, latt_in=(abc_ref, angle_ref, abc_def, angle_def), timing=timing)
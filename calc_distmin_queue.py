@@ -0,0 +1,74 @@
+import numpy as np
+import os as os
+import sys as sys
+import getpass as getpass
+import tempfile as tempfile
+
+from module import corrmat as cm
+from module import distmin as dm
+from module import crystallo as cr
+from module import workqueue as wq
+
+'''
+Input
+'''
+# Number of atoms/molecules in unit cell
+p = 2 # reference phase
+q = 1 # deformed phase
+
+# Unit cell parameters of the reference configuration
+abc_ref = np.array([15.7380, 9.2352, 15.7040])
+angle_ref = np.array([90, 109.1209, 90])
+
+# Unit cell parameters of the deformed configuration
+abc_def = np.array([12.8946, 9.4837, 9.3384])
+angle_def = np.array([90, 90, 90])
+
+# Queue directory on the filesystem shared by every node
+queue_dir = os.path.join(os.getcwd(), 'calc_data', 'queue')
+
+# Results table on a disk local to the node running the reducer, SQLite locking is not reliable on the shared filesystem
+store_path = os.environ.get('DISTMIN_STORE') or os.path.join(tempfile.gettempdir(), f'distmin_{getpass.getuser()}', 'results.sqlite')
+
+# Role of this run, given as the first argument
+#    coordinator: writes the tiles,  worker: calculates tiles,  reduce: merges and saves,  local N: all of them with N processes
+role = sys.argv[1] if len(sys.argv) > 1 else 'local'
+
+'''
+Calculation
+'''
+# Largest edge ratio
+d = round(max(np.array([*abc_ref, *abc_def])) / min(np.array([*abc_ref, *abc_def])))
+
+# Converts unit cell parameters (fractional coordinate) to lattice vectors (Cartesian coordinate)
+reflat = cr.unit2vect(abc_ref, angle_ref)
+deflat = cr.unit2vect(abc_def, angle_def)
+
+if role in ['coordinator', 'local']:
+    # Generates correspondance matricies if it doesnt exist in file and writes the tiles
+    cm.saveCorMat(d, packed=True)
+    # The tiles and fragments of the previous run are removed, workers still running on that run stop by themselves
+    wq.makeQueue(queue_dir, d, p, q, reflat, deflat, packed=True, clear=True)
+
+if role == 'worker':
+    wq.runWorker(queue_dir)
+    sys.exit(0)
+
+if role == 'coordinator':
+    sys.exit(0)
+
+if role == 'local':
+    n_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    distFunc, U, P_ref, P_def = wq.runLocal(queue_dir, n_workers)
+else:
+    distFunc, U, P_ref, P_def = wq.reduceQueue(queue_dir)
+
+# Calculates the new unit cell parameters
+abc_ref_new, abc_def_new, angle_ref_new, angle_def_new = dm.newLatt(reflat, deflat, P_ref, P_def)
+
+'''
+Output
+'''
+# Only the reducer appends to the results table, which is on a local disk of the node running it
+dm.saveDist(distFunc, U, P_ref, P_def, abc_ref_new, abc_def_new, angle_ref_new, angle_def_new,
+            p=p, q=q, d=d, latt_in=(abc_ref, angle_ref, abc_def, angle_def), path=store_path)
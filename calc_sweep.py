@@ -0,0 +1,48 @@
+import numpy as np
+import os as os
+
+from module import distmin as dm
+from module import sweep as sw
+
+'''
+Input
+'''
+# Number of atoms/molecules in unit cell
+p = 1 # reference phase
+q = 2 # deformed phase
+
+# Maximum integer of the correspondance matricies
+d = 2
+
+# Unit cell parameters of every point of the series, e.g. over temperature
+abc_ref = np.array([[5.030, 5.395, 7.202],
+                    [5.034, 5.399, 7.209],
+                    [5.038, 5.404, 7.216]])
+angle_ref = np.array([[103.413, 100.269, 92.382],
+                      [103.420, 100.265, 92.380],
+                      [103.428, 100.260, 92.377]])
+abc_def = np.array([[5.3663, 7.268, 10.160],
+                    [5.3702, 7.274, 10.171],
+                    [5.3741, 7.281, 10.183]])
+angle_def = np.array([[104.149, 97.699, 92.382],
+                      [104.155, 97.702, 92.380],
+                      [104.162, 97.706, 92.377]])
+
+# Number of candidates carried from one point to the next
+n_warm = 20
+
+'''
+Calculation
+'''
+# Finds the three minimum distance functions of every point, warm started from the previous point
+latt_list = list(zip(abc_ref, angle_ref, abc_def, angle_def))
+table = sw.sweepDist(p, q, d, latt_list, k=3, n_warm=n_warm)
+
+'''
+Output
+'''
+# Saves every point to the results table
+for n, latt_in in enumerate(latt_list):
+    dm.saveDist(table['dist'][n], table['U'][n], table['P_ref'][n], table['P_def'][n],
+                table['abc_ref'][n], table['abc_def'][n], table['angle_ref'][n], table['angle_def'][n],
+                p=p, q=q, d=d, latt_in=latt_in, timing={'sweepDist': table['runtime'][n]})
@@ -12,7 +12,7 @@ __author__ = 'Yunsu Park'
 __version__ = '0.1.0'
 
 # --- Crystallography tools ---
-from .crystallo import unit2vect
+from .crystallo import unit2vect, vect2unit
 
 # --- Correspondance matrix generation tools ---
 from .corrmat import saveCorMat
@@ -20,6 +20,16 @@ from .corrmat import saveCorMat
 # --- Distance minimization tools ---
 from .distmin import calcDist
 
+# --- Kinematic compatibility tools ---
+from .micromech import rankcomp
+
+# --- Results store tools ---
+from .store import queryStore, loadStore
+
 __all__ = ['unit2vect',
+           'vect2unit',
            'saveCorMat',
-           'calcDist']
+           'calcDist',
+           'rankcomp',
+           'queryStore',
+           'loadStore']
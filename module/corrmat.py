@@ -11,8 +11,11 @@ Contact: yunsu@ucsb.edu
 
 import numpy as np
 import os as os
+import shutil as shutil
+import queue as qu
+import threading as th
 
-def genCorMat(dir_path, d):
+def genCorMat(dir_path, d, packed=False):
     '''
     Generates all possible correspondance matrix given d and saves it in a file
 
@@ -21,10 +24,15 @@ def genCorMat(dir_path, d):
             path that will save the generated correspondance matrix
         d (integer): 
             maximum integer difference between the length between the unit cell parameter of the reference to transformed configuration
+        packed (bool):
+            saves the files bit packed (see packCorMat) instead of as int8 matricies
 
     Returns:
         int: Always returns 0 to indicate completion.
     '''
+
+    def save(file_path, P):
+        np.save(file_path, packCorMat(P, d) if packed else P.astype(np.int8))
     
     # Initialize the correspondance matrix file
     elements = list(range(-d, d + 1))                   #all posible range of d
@@ -58,7 +66,7 @@ def genCorMat(dir_path, d):
                                             if count[detPint-1] > n-1:
                                                 filename = f'Pmat_d{d}_det{detPint}_{countSave[detPint-1]}.npy'
                                                 file_path = os.path.join(dir_path, filename)
-                                                np.save(file_path, Pdata[:, detPint-1, :, :].astype(np.int8))
+                                                save(file_path, Pdata[:, detPint-1, :, :])
 
                                                 countSave[detPint-1] += 1
                                                 count[detPint-1] = 0
@@ -68,12 +76,12 @@ def genCorMat(dir_path, d):
 
         filename = f'Pmat_d{d}_det{i+1}_{countSave[i]}.npy'
         file_path = os.path.join(dir_path, filename)
-        np.save(file_path, Pdata_unique.astype(np.int8))
+        save(file_path, Pdata_unique)
     
     Pdata0 = np.array([[[1, 0, 0], [0, 1, 0], [0, 0, 1]], [[1, 0, 0], [0, 1, 0], [0, 0, 1]]])
     filename = f'Pmat_d{d}_det{0}_{0}.npy'
     file_path = os.path.join(dir_path, filename)
-    np.save(file_path, Pdata0.astype(np.int8))
+    save(file_path, Pdata0)
 
     print(f'   COMPLETE: Correspondance matricies for d = {d} saved') 
     print(f'             Saved at file path "{dir_path}"')
@@ -81,36 +89,147 @@ def genCorMat(dir_path, d):
     
     return 0
 
-def saveCorMat(d):
+def saveCorMat(d, packed=False):
     '''
     Determines the directory path the correspondance matrix file will be saved in which will be "./data/data_d*"
 
     Parameters:
         d (integer): 
             maximum integer difference between the length between the unit cell parameter of the reference to transformed configuration
+        packed (bool):
+            makes the bit packed files "./data/data_d*_packed" (see packCorMat) instead, converted from "./data/data_d*" if it exists
+            and generated directly otherwise, so the int8 files are not written for a new d
 
     Returns:
         int: Always returns 0 to indicate completion.
     '''
 
+    # Checks that d can be packed before any generation work
+    if packed and d > 7:
+        raise ValueError(f'Correspondance matricies with d = {d} > 7 cannot be packed')
+
     # Fetches the directory path that the file will be saved in
     dir_path = os.path.join(os.getcwd(), 'data', f'data_d{d}')
+    unpacked_path = dir_path
+    if packed:
+        dir_path = f'{dir_path}_packed'
 
     # Checks if correspondance matrix file exists
     print('Checking correspondance matrix file')
     if not os.path.exists(dir_path):
-        # Makes directory and generates correspondance matrix file if path doesnt exist
-        print('File does not exist')
-        print('Generating correspondance matrix file')
-        os.mkdir(dir_path)
-        genCorMat(dir_path, d)
+        # Files are written to a temporary directory that is renamed when complete, so an interrupted run never leaves a partial set
+        tmp_path = f'{dir_path}.tmp'
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        if packed and os.path.exists(unpacked_path):
+            convCorMat(unpacked_path, tmp_path, d)
+        else:
+            # Makes directory and generates correspondance matrix file if path doesnt exist
+            print('File does not exist')
+            print('Generating correspondance matrix file')
+            genCorMat(tmp_path, d, packed)
+
+        os.replace(tmp_path, dir_path)
     else:
         # Skips file generation if path exists
         print('   COMPELTE: Correspondance matrix files for d = ', d, ' already exits at "', dir_path, '" \n')
 
     return 0
 
-def readCorMat(d, p, q):
+def packCorMat(P, d):
+    '''
+    Packs correspondance matricies into one integer each, every element is stored as element + offset in a fixed number of bits
+
+    Parameters:
+        P (ndarray [shape (N, 3, 3)]):
+            correspondance matricies with elements in [-d, d]
+        d (integer):
+            maximum integer of the correspondance matricies
+
+    Returns:
+        codes (ndarray [shape (N,)]):
+            uint32 with 3 bits per element for d <= 3, uint64 with 4 bits per element for d <= 7
+    '''
+    if d <= 3:
+        dtype, bits, offset = np.uint32, 3, 3
+    elif d <= 7:
+        dtype, bits, offset = np.uint64, 4, 7
+    else:
+        raise ValueError(f'Correspondance matricies with d = {d} > 7 cannot be packed')
+
+    shifts = np.arange(9, dtype=np.uint64) * np.uint64(bits)
+    elems = (np.asarray(P).reshape(-1, 9).astype(np.int64) + offset).astype(np.uint64)
+    codes = np.bitwise_or.reduce(elems << shifts, axis=1).astype(dtype)
+
+    return codes
+
+def unpackCorMat(codes, out=None):
+    '''
+    Unpacks the integers of packCorMat to correspondance matricies, the packing is read from the dtype
+
+    Parameters:
+        codes (ndarray [shape (N,)]):
+            uint32 or uint64 packed correspondance matricies
+        out (ndarray [shape (N, 3, 3)]):
+            int8 array the correspondance matricies are written into, a new array if None
+
+    Returns:
+        P (ndarray [shape (N, 3, 3)]):
+            int8 correspondance matricies
+    '''
+    codes = np.asarray(codes)
+    if codes.dtype == np.uint32:
+        bits, offset = 3, 3
+    elif codes.dtype == np.uint64:
+        bits, offset = 4, 7
+    else:
+        raise ValueError(f'Packed correspondance matricies must be uint32 or uint64, not {codes.dtype}')
+
+    if out is None:
+        out = np.empty((codes.shape[0], 3, 3), dtype=np.int8)
+
+    shifts = (np.arange(9) * bits).astype(codes.dtype)
+    mask = codes.dtype.type((1 << bits) - 1)
+    out.reshape(-1, 9)[...] = ((codes[:, None] >> shifts) & mask).astype(np.int8) - offset
+
+    return out
+
+def convCorMat(dir_path, packed_path, d):
+    '''
+    Writes the bit packed copy of every correspondance matrix file of a directory with the same file names,
+    saveCorMat converts into a temporary directory that is only renamed to the packed directory when complete
+
+    Parameters:
+        dir_path (string):
+            directory of the correspondance matrix files
+        packed_path (string):
+            directory the packed files are saved in
+        d (integer):
+            maximum integer of the correspondance matricies
+
+    Returns:
+        int: Always returns 0 to indicate completion.
+    '''
+    print('Packing correspondance matrix files')
+    os.makedirs(packed_path, exist_ok=True)
+
+    size = 0
+    size_packed = 0
+    files = sorted(file for file in os.listdir(dir_path) if file.endswith('.npy'))
+    for file in files:
+        np.save(os.path.join(packed_path, file), packCorMat(np.load(os.path.join(dir_path, file)), d))
+
+        size += os.path.getsize(os.path.join(dir_path, file))
+        size_packed += os.path.getsize(os.path.join(packed_path, file))
+
+    print(f'   COMPLETE: {len(files)} files packed from {size/1e6:.1f} MB to {size_packed/1e6:.1f} MB')
+    print(f'             Saved at file path "{packed_path}" \n')
+
+    return 0
+
+def readCorMat(d, p, q, packed=False):
     '''
     Reads the correspondance matrix file with the given value of d
 
@@ -121,6 +240,8 @@ def readCorMat(d, p, q):
             determinant of reference configuration
         q (integer):
             determinant of deformed configuration
+        packed (bool):
+            reads the bit packed files of saveCorMat(d, packed=True)
             
     Returns:
         file_path (string): 
@@ -134,8 +255,8 @@ def readCorMat(d, p, q):
     print('Reading correspondance matrix data files')
 
     # Finds files for d
-    file_path = os.path.join(os.getcwd(), 'data', f'data_d{d}')
-    files = os.listdir(file_path)
+    file_path = os.path.join(os.getcwd(), 'data', f'data_d{d}_packed' if packed else f'data_d{d}')
+    files = [file for file in os.listdir(file_path) if file.endswith('.npy')]
     # Checks which files to read
     m = p/q
     if int(m) == m:
@@ -155,4 +276,141 @@ def readCorMat(d, p, q):
 
     print(f'   COMPLETE: reference files read {ref_files}')
     print(f'             deformed files read {def_files}\n')
-    return file_path, ref_files, def_files
\ No newline at end of file
+    return file_path, ref_files, def_files
+
+def readRows(path, start=None, stop=None, buf=None):
+    '''
+    Reads rows [start, stop) of a correspondance matrix file into a preallocated buffer, unpacking bit packed files (packCorMat) on the fly
+
+    Parameters:
+        path (string):
+            path to the .npy file
+        start, stop (integer):
+            row range to read, the whole file if None
+        buf (tuple):
+            buffers of a previous read that are reused if they are large enough and of the same dtype
+
+    Returns:
+        P (ndarray [shape (stop - start, 3, 3)]):
+            view of the buffer holding the rows
+        buf (tuple):
+            buffers that were read into, to be passed again on the next read
+    '''
+    raw_buf, P_buf = (None, None) if buf is None else buf
+
+    with open(path, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+        start = 0 if start is None else start
+        stop = shape[0] if stop is None else min(stop, shape[0])
+        n = max(stop - start, 0)
+
+        if raw_buf is None or raw_buf.dtype != dtype or raw_buf.shape[1:] != shape[1:] or raw_buf.shape[0] < n:
+            raw_buf = np.empty((n, *shape[1:]), dtype=dtype)
+        raw = raw_buf[:n]
+
+        if fortran_order:
+            raw[...] = np.load(path, mmap_mode='r')[start:stop]
+        else:
+            # Reads the raw bytes of the rows straight into the buffer
+            f.seek(start * int(np.prod(shape[1:], dtype=int)) * dtype.itemsize, 1)
+            raw_bytes = raw.reshape(-1).view(np.uint8)
+            pos = 0
+            while pos < raw_bytes.shape[0]:
+                count = f.readinto(raw_bytes[pos:])
+                if not count:
+                    raise EOFError(f'{path} ended before row {stop}')
+                pos += count
+
+    # Packed files hold one unsigned integer per correspondance matrix
+    if dtype.kind != 'u':
+        return raw, (raw_buf, P_buf)
+
+    if P_buf is None or P_buf.shape[0] < n:
+        P_buf = np.empty((n, 3, 3), dtype=np.int8)
+    P = unpackCorMat(raw, P_buf[:n])
+
+    return P, (raw_buf, P_buf)
+
+def prefetchCorMat(file_path, tiles, depth=2, spec=None):
+    '''
+    Reads the correspondance matrix files of the next tiles in a background thread while the current tile is calculated
+
+    Each tile is a tuple of file specs, a spec is a file name or a tuple (file name, start row, stop row).
+    The arrays are read into depth + 2 sets of reused buffers, so an array yielded is only valid until the next tile is requested.
+    A spec equal to the one at the same position of the previous tile is not read again, e.g. the reference file of loopDist.
+
+    Parameters:
+        file_path (string):
+            directory for the folder with files with d
+        tiles (iterable):
+            tiles to read, may be a generator that is consumed in the background thread
+        depth (integer):
+            maximum number of tiles read ahead of the current tile
+        spec (function):
+            converts each tile to its tuple of file specs, the tile itself is the tuple if None
+
+    Yields:
+        tile:
+            the tile as given in tiles
+        Ps (list [shape (*, 1)]):
+            arrays of the file specs of the tile
+    '''
+
+    # A queue of size 0 would be unbounded, so at least one tile is read ahead
+    depth = max(depth, 1)
+    buffers = [{} for _ in range(depth + 2)]
+    queue = qu.Queue(maxsize=depth)
+    stop = th.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except qu.Full:
+                pass
+        return False
+
+    # Spec, buffer set and array of the previous tile at each position
+    last = {}
+
+    def produce():
+        try:
+            for n, tile in enumerate(tiles):
+                slot = buffers[n % (depth + 2)]
+                Ps = []
+                for pos, file in enumerate(tile if spec is None else spec(tile)):
+                    if pos in last and last[pos][0] == file:
+                        # The buffer is handed over to this set so it stays valid as long as this tile
+                        _, prev_slot, P = last[pos]
+                        slot[pos], prev_slot[pos] = prev_slot[pos], slot.get(pos)
+                    else:
+                        name, start, end = (file, None, None) if isinstance(file, str) else file
+                        P, slot[pos] = readRows(os.path.join(file_path, name), start, end, slot.get(pos))
+                    last[pos] = (file, slot, P)
+                    Ps.append(P)
+                if not put((tile, Ps)):
+                    return
+            put(None)
+        except BaseException as err:
+            put(err)
+
+    thread = th.Thread(target=produce, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = queue.get()
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Stops the background thread if the caller stops early
+        stop.set()
@@ -16,24 +16,27 @@ def unit2vect(abc, angle):
     Converts unit cell parameters (fractional coordinate) to lattice vectors (Cartesian coordinate)
 
     Parameters:
-        abc (ndarray [shape (1, 3)]): 
+        abc (ndarray [shape (*, 3)]): 
             unit cell parameter lengths a, b, c
-        angle (ndarray [shape (1, 3)]): 
+        angle (ndarray [shape (*, 3)]): 
             unit cell parameter angles alpha, beta, gamma
 
     Returns:
-        latvec (ndarray [shape (3, 3)]):
+        latvec (ndarray [shape (*, 3, 3)]):
             lattice matrix with a as the parallel vector
             [[a1, b1, c1], 
              [0,  b2, c2], 
              [0,  0,  c3]]
     """
 
+    # Broadcasts the lengths and angles against each other
+    abc, angle = np.broadcast_arrays(np.asarray(abc, dtype=float), np.asarray(angle, dtype=float))
+
     # Unit cell parameters length a, b, c
-    a, b, c = [l for l in abc]
+    a, b, c = abc[..., 0], abc[..., 1], abc[..., 2]
 
     # Unit cell parameter angles alpha, beta, gamma
-    alp, bet, gam = [deg * np.pi/180 for deg in angle]
+    alp, bet, gam = [angle[..., i] * np.pi/180 for i in range(3)]
 
     # Lattaice matrix elements
     a1 = a
@@ -44,9 +47,10 @@ def unit2vect(abc, angle):
     c3 = (c/np.sin(gam)) * np.sqrt(1-(np.cos(alp))**2-(np.cos(bet))**2-(np.cos(gam))**2 + 2*np.cos(alp)*np.cos(bet)*np.cos(gam))
 
     # Lattaice matrix 
-    latvec = np.array([[a1, b1, c1],
-                       [0,  b2, c2],
-                       [0,  0,  c3]])
+    zero = np.zeros_like(a1)
+    latvec = np.stack([np.stack([a1,   b1,   c1], axis=-1),
+                       np.stack([zero, b2,   c2], axis=-1),
+                       np.stack([zero, zero, c3], axis=-1)], axis=-2)
     
     if np.isnan(latvec).any():
         print('ERROR: there is a nan value in the lattice vector')
@@ -54,32 +58,55 @@ def unit2vect(abc, angle):
 
     return latvec
 
+def vect2unit(latvec):
+    """
+    Converts lattice vectors (Cartesian coordinate) to unit cell parameters, the inverse of unit2vect
+
+    Parameters:
+        latvec (ndarray [shape (*, 3, 3)]):
+            lattice matrix with the lattice vectors a, b, c as columns
+
+    Returns:
+        abc (ndarray [shape (*, 3)]): 
+            unit cell parameter lengths a, b, c
+        angle (ndarray [shape (*, 3)]): 
+            unit cell parameter angles alpha, beta, gamma
+    """
+
+    latvec = np.asarray(latvec, dtype=float)
+
+    # Metric tensor G_ij = e_i . e_j
+    G = np.swapaxes(latvec, -1, -2) @ latvec
+    abc = np.sqrt(np.diagonal(G, axis1=-2, axis2=-1))
+
+    # Angle between b and c, a and c, a and b
+    cos = np.stack([G[..., 1, 2] / (abc[..., 1]*abc[..., 2]),
+                    G[..., 0, 2] / (abc[..., 0]*abc[..., 2]),
+                    G[..., 0, 1] / (abc[..., 0]*abc[..., 1])], axis=-1)
+    angle = np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+    return abc, angle
+
 def frac2cart(milfrac, latvec):
     """
     Converts fractional coordinates to cartesian coordinates
 
     Parameters:
-        milfrac (ndarray [shape (1, 3)]): 
+        milfrac (ndarray [shape (*, 3)]): 
             miller indice with fractional coordinate (h, k, l)
-        latvec (ndarray [shape (3, 3)]):
+        latvec (ndarray [shape (*, 3, 3)]):
             lattice matrix with a as the parallel vector
             [[a1, b1, c1], 
              [0,  b2, c2], 
              [0,  0,  c3]]
 
     Returns:
-        milvec (ndarray [shape (3, 1)]):
+        milvec (ndarray [shape (*, 3)]):
             miller indice in vector form in cartesian coordinate
     """
-    # Millar indice (h k l)
-    h, k, l = [ind for ind in milfrac]
-
-    # latticce vectors
-    e1 = latvec[:,0]
-    e2 = latvec[:,1]
-    e3 = latvec[:,2]
 
-    milvec = h*e1 + k*e2 + l*e3
+    # milvec = h*e1 + k*e2 + l*e3 with the leading axes broadcast
+    milvec = (np.asarray(latvec) @ np.asarray(milfrac)[..., None])[..., 0]
 
     return milvec
 
@@ -88,45 +115,79 @@ def cart2frac(milvec, latvec):
     Converts Cartesian coordinates to fractional coordinates
 
     Parameters:
-        milvec (ndarray [shape (3, 1)]):
+        milvec (ndarray [shape (*, 3)]):
             miller indice in vector form in cartesian coordinate    
 
-        latvec (ndarray [shape (3, 3)]):
+        latvec (ndarray [shape (*, 3, 3)]):
             lattice matrix with a as the parallel vector
             [[a1, b1, c1], 
              [0,  b2, c2], 
              [0,  0,  c3]]
 
     Returns:
-        milfrac (ndarray [shape (1, 3)]): 
+        milfrac (ndarray [shape (*, 3)]): 
             miller indice with fractional coordinate (*, *, *)
     """
 
+    milvec, latvec = np.asarray(milvec, dtype=float), np.asarray(latvec, dtype=float)
+
+    # Solves latvec @ milfrac = milvec with the leading axes broadcast
+    shape = np.broadcast_shapes(milvec.shape[:-1], latvec.shape[:-2])
+    milfrac = np.linalg.solve(np.broadcast_to(latvec, (*shape, 3, 3)),
+                              np.broadcast_to(milvec, (*shape, 3))[..., None])[..., 0]
+
+    return milfrac
+
+def mil2norm(milfrac, latvec):
+    """
+    Converts miller indices of a plane to the vector normal to the plane in Cartesian coordinate
+
+    Parameters:
+        milfrac (ndarray [shape (*, 3)]): 
+            miller indice of the plane (h, k, l)
+        latvec (ndarray [shape (*, 3, 3)]):
+            lattice matrix with a as the parallel vector
+            [[a1, b1, c1], 
+             [0,  b2, c2], 
+             [0,  0,  c3]]
+
+    Returns:
+        milnorm (ndarray [shape (*, 3)]):
+            vector normal to the plane, h*e1* + k*e2* + l*e3* with the reciprocal lattice vectors e*
+    """
+
+    # The reciprocal lattice vectors are the columns of the inverse transpose of the lattice matrix
+    milnorm = cart2frac(milfrac, np.swapaxes(np.asarray(latvec, dtype=float), -1, -2))
+
+    return milnorm
+
 def deltang(vec1, vec2):
     """
     Calculates the angle between two vectors
 
     Parameters:
-        vec1 (ndarray [shape (3, 1)]):
+        vec1 (ndarray [shape (*, 3)]):
             vector 1
 
-        vec2 (ndarray [shape (3, 1)]):
+        vec2 (ndarray [shape (*, 3)]):
             vector 2
 
     Returns:
-        theta (float): 
+        theta (float or ndarray [shape (*)]): 
             angle in degrees between vec1 and vec2
     """
         
+    vec1, vec2 = np.asarray(vec1, dtype=float), np.asarray(vec2, dtype=float)
+
     # Normalize the vectors
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
+    norm1 = np.linalg.norm(vec1, axis=-1)
+    norm2 = np.linalg.norm(vec2, axis=-1)
 
     # Checks for zero length vectors
-    if norm1 == 0 or norm2 == 0:
+    if np.any(norm1 == 0) or np.any(norm2 == 0):
         raise ValueError("One of the vectors is zero-length.")
     
-    cos = np.dot(vec1, vec2) / (norm1*norm2)
+    cos = np.sum(vec1*vec2, axis=-1) / (norm1*norm2)
 
     # Clip to avoid numerical issues at theta ~ n*(pi/2)
     cos = np.clip(cos, -1.0, 1.0)
@@ -140,20 +201,22 @@ def minang(n, n_n, milvec):
     Finds the minimum angle between normal vectors
 
     Parameters:
-        n (ndarray [shape (3, 1)]):
+        n (ndarray [shape (*, 3)]):
             analytical vector normal to habit plane from kinematic compatibility with kappa = 1
 
-        n_n (ndarray [shape (3, 1)]):
+        n_n (ndarray [shape (*, 3)]):
             analytical vector normal to habit plane from kinematic compatibility with kappa = -1
 
-        milvec (ndarray [shape (3, 1)]):
+        milvec (ndarray [shape (*, 3)]):
             experimental vector normal to habit plane    
         
     Returns:
-        theta (float): 
+        theta (float or ndarray [shape (*)]): 
             minimum angle between the analytical and experimental normal vector
     """
 
+    milvec = np.asarray(milvec, dtype=float)
+
     # 4 possible theta values
     theta1 = deltang(n, milvec)
     theta2 = deltang(n, -milvec)
@@ -161,6 +224,6 @@ def minang(n, n_n, milvec):
     theta4 = deltang(n_n, -milvec)
 
     # Finds the minimun of the 4 theta values
-    theta = np.min([theta1, theta2, theta3, theta4])
+    theta = np.min([theta1, theta2, theta3, theta4], axis=0)
 
     return theta
\ No newline at end of file
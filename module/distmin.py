@@ -10,7 +10,10 @@ Contact: yunsu@ucsb.edu
 '''
 
 import numpy as np
-import os as os
+
+from . import corrmat as cm
+from . import crystallo as cr
+from . import store as st
 
 def calcDist(E_ref, E_def, P_ref, P_def):
     '''
@@ -37,9 +40,9 @@ def calcDist(E_ref, E_def, P_ref, P_def):
 
     # Polar Decomposes the deformation gradiet to calculate the stretch tensor U
     C = F.T @ F
-    eig_val, eig_vec = np.linalg.eig(C)
+    eig_val, eig_vec = np.linalg.eigh(C)
     lam = np.sqrt(eig_val)
-    U = lam[0]*np.outer(eig_vec[0],eig_vec[0]) + lam[1]*np.outer(eig_vec[1],eig_vec[1]) + lam[2]*np.outer(eig_vec[2],eig_vec[2])
+    U = lam[0]*np.outer(eig_vec[:,0],eig_vec[:,0]) + lam[1]*np.outer(eig_vec[:,1],eig_vec[:,1]) + lam[2]*np.outer(eig_vec[:,2],eig_vec[:,2])
 
     # Calculates the distance function defined by Chen et al. 
     U2 = U.T @ U
@@ -49,9 +52,9 @@ def calcDist(E_ref, E_def, P_ref, P_def):
 
     return distFunc, U
 
-def loopDist(file_path, ref_files, def_files, reflat, deflat):
+def loopDist(file_path, ref_files, def_files, reflat, deflat, k=3, depth=2, shell=None):
     '''
-    Loops through each possible combination of correspondance matrix for each configuration and finds the three minimum distance
+    Loops through each possible combination of correspondance matrix for each configuration and finds the k minimum distance
 
     Parameters:
         file_path (string): 
@@ -64,54 +67,243 @@ def loopDist(file_path, ref_files, def_files, reflat, deflat):
             lattice vector for the reference configuration
         reflat (ndarray [shape (3, 3)]): 
             lattice vector for the deformed configuration
+        k (integer):
+            number of minimum distance functions kept
+        depth (integer):
+            number of file pairs read ahead in the background while the current pair is calculated
+        shell (integer):
+            only calculates the pairs whose largest absolute element is shell, i.e. the pairs not already in the files of shell - 1
 
     Returns:
-        distFunc_stored (ndarray [shape (3, 1)]):
-            distance function that is top three min
-        U_stored (ndarray [shape (3, 3, 3)]): 
-            stretch tensor with distance function that is top three min
-        P_ref_stored (ndarray [shape (3, 3, 3)]): 
-            correspondance matrix with distance function that is top three min
-        P_def_stored (ndarray [shape (3, 3, 3)]): 
-            correspondance matrix with distance function that is top three min
+        distFunc_stored (ndarray [shape (k, 1)]):
+            distance function that is top k min
+        U_stored (ndarray [shape (k, 3, 3)]): 
+            stretch tensor with distance function that is top k min
+        P_ref_stored (ndarray [shape (k, 3, 3)]): 
+            correspondance matrix with distance function that is top k min
+        P_def_stored (ndarray [shape (k, 3, 3)]): 
+            correspondance matrix with distance function that is top k min
     '''
     print('Calculating minimum distance function')
 
     # Initialization
-    P_ref_stored = np.zeros((3, 3, 3))
-    P_def_stored = np.zeros((3, 3, 3))
-    distFunc_stored = np.ones((3,1)) * 1e100
-    U_stored = np.zeros((3, 3, 3))
-
-    # Loops through the correspondance files
-    for i in range(len(ref_files)):
-        P_ref_file = np.load(os.path.join(file_path, ref_files[i]))
-        
-        for j in range(len(def_files)):
-            P_def_file = np.load(os.path.join(file_path, def_files[j]))
-
-            # Loops through the correspondance matrix
-            for k in range(P_ref_file.shape[0]):
-                P_ref = P_ref_file[k]
-                #print(f'Calculating File: {i+1}/{len(ref_files)} --- Completed Matrix: {k+1}/{P_ref_file.shape[0]}')
-
-                for l in range(P_def_file.shape[0]):
-                    P_def = P_def_file[l]
-                    distFunc, U = calcDist(reflat, deflat, P_ref, P_def)
-
-                    # Find if this distFunc is better than one of the top 3
-                    worst_idx = np.argmax(distFunc_stored)
-                    if distFunc < distFunc_stored[worst_idx]:
-                        distFunc_stored[worst_idx] = distFunc
-                        P_ref_stored[worst_idx] = P_ref
-                        P_def_stored[worst_idx] = P_def
-                        U_stored[worst_idx] = U
-
-    print('   Complete: the three lowest distance function is')
+    results = [(np.ones((k,1)) * 1e100, np.zeros((k, 3, 3)), np.zeros((k, 3, 3)), np.zeros((k, 3, 3)))]
+
+    # Loops through the combinations of correspondance files, the next files are read while the current ones are calculated
+    tiles = [(ref_file, def_file) for ref_file in ref_files for def_file in def_files]
+    for (ref_file, def_file), (P_ref_file, P_def_file) in cm.prefetchCorMat(file_path, tiles, depth):
+        #print(f'Calculating Files: {ref_file} x {def_file}')
+        if shell is None:
+            results = [mergeDist(results + [tileDist(P_ref_file, P_def_file, reflat, deflat, k)], k)]
+            continue
+
+        # Pairs on the shell: reference on the shell with any deformed, reference inside with deformed on the shell
+        ref_on = np.abs(P_ref_file).max(axis=(1, 2)) == shell
+        def_on = np.abs(P_def_file).max(axis=(1, 2)) == shell
+        for P_ref_shell, P_def_shell in [(P_ref_file[ref_on], P_def_file), (P_ref_file[~ref_on], P_def_file[def_on])]:
+            if P_ref_shell.shape[0] and P_def_shell.shape[0]:
+                results = [mergeDist(results + [tileDist(P_ref_shell, P_def_shell, reflat, deflat, k)], k)]
+
+    distFunc_stored, U_stored, P_ref_stored, P_def_stored = results[0]
+
+    print(f'   Complete: the {k} lowest distance function is')
     print(' ' * 12, np.array2string(distFunc_stored, prefix=' ' * 12), '\n')
     return distFunc_stored, U_stored, P_ref_stored, P_def_stored
 
-def saveDist(distFunc, U, P_ref, P_def, abc_ref, abc_def, angle_ref, angle_def):
+def tileDist(P_ref_tile, P_def_tile, reflat, deflat, k=3, block=2**17):
+    '''
+    Calculates the distance function of every combination of two stacks of correspondance matrix at once and finds the k minimum distance
+
+    With S = (E_ref P_ref)^T (E_ref P_ref) and K = inv((E_def P_def)^T (E_def P_def)) the distance function of calcDist is
+    tr(KSKS) - 2 tr(KS) + 3, so each pair only costs a (9,9) quadratic form and the stretch tensor is only calculated for the top k
+
+    Parameters:
+        P_ref_tile (ndarray [shape (N, 3, 3)]): 
+            correspondance matricies for the reference configuration
+        P_def_tile (ndarray [shape (M, 3, 3)]): 
+            correspondance matricies for the deformed configuration
+        reflat (ndarray [shape (3, 3)]): 
+            lattice vector for the reference configuration
+        deflat (ndarray [shape (3, 3)]): 
+            lattice vector for the deformed configuration
+        k (integer):
+            number of minimum distance functions kept
+        block (integer):
+            maximum number of pairs calculated at once, bounds the memory used
+
+    Returns:
+        distFunc_stored, U_stored, P_ref_stored, P_def_stored:
+            top k min as returned by loopDist
+    '''
+
+    # Metric tensors of the new lattices
+    G = reflat @ np.asarray(P_ref_tile, dtype=float)
+    H = deflat @ np.asarray(P_def_tile, dtype=float)
+    S = np.swapaxes(G, 1, 2) @ G
+    K = np.linalg.inv(np.swapaxes(H, 1, 2) @ H).reshape(-1, 9)
+
+    # tr(KSKS) = vec(K)^T T vec(K) with T_(ab)(cd) = S_bc S_da
+    T = np.einsum('nbc,nda->nabcd', S, S).reshape(-1, 9, 9)
+    S = S.reshape(-1, 9)
+
+    # Running top k as flat pair indices
+    best_dist = np.empty(0)
+    best_idx = np.empty(0, dtype=np.int64)
+
+    nd = K.shape[0]
+    rows = max(1, block // max(nd, 1))
+    for r0 in range(0, S.shape[0], rows):
+        r1 = min(r0 + rows, S.shape[0])
+        dist = np.einsum('rdx,dx->rd', K[None] @ T[r0:r1], K) - 2 * S[r0:r1] @ K.T + 3
+
+        # Merges the top k of the block with the running top k
+        dist = np.concatenate([best_dist, dist.ravel()])
+        idx = np.concatenate([best_idx, np.arange(r0 * nd, r1 * nd, dtype=np.int64)])
+        if dist.shape[0] > k:
+            keep = np.argpartition(dist, k - 1)[:k]
+            dist, idx = dist[keep], idx[keep]
+        best_dist, best_idx = dist, idx
+
+    # Recalculates the top k with calcDist for the stretch tensor
+    P_ref_stored = np.zeros((k, 3, 3))
+    P_def_stored = np.zeros((k, 3, 3))
+    distFunc_stored = np.ones((k,1)) * 1e100
+    U_stored = np.zeros((k, 3, 3))
+    for i, n in enumerate(best_idx[np.argsort(best_dist)]):
+        P_ref_stored[i] = P_ref_tile[n // nd]
+        P_def_stored[i] = P_def_tile[n % nd]
+        distFunc_stored[i], U_stored[i] = calcDist(reflat, deflat, P_ref_stored[i], P_def_stored[i])
+
+    return distFunc_stored, U_stored, P_ref_stored, P_def_stored
+
+def mergeDist(results, k=3):
+    '''
+    Merges several top k min results, e.g. of different tiles, to the top k min of all of them
+
+    Parameters:
+        results (list [shape (*, 1)]):
+            tuples of (distFunc_stored, U_stored, P_ref_stored, P_def_stored) as returned by loopDist or tileDist
+        k (integer):
+            number of minimum distance functions kept
+
+    Returns:
+        distFunc_stored, U_stored, P_ref_stored, P_def_stored:
+            top k min as returned by loopDist
+    '''
+
+    distFunc, U, P_ref, P_def = [np.concatenate([np.reshape(res[i], (-1, *shape)) for res in results])
+                                 for i, shape in enumerate([(1,), (3, 3), (3, 3), (3, 3)])]
+
+    # Pads with the loopDist initialization when there are less than k results
+    n = max(k - distFunc.shape[0], 0)
+    distFunc = np.concatenate([distFunc, np.ones((n, 1)) * 1e100])
+    U, P_ref, P_def = [np.concatenate([arr, np.zeros((n, 3, 3))]) for arr in [U, P_ref, P_def]]
+
+    keep = np.argsort(distFunc[:, 0], kind='stable')[:k]
+
+    return distFunc[keep], U[keep], P_ref[keep], P_def[keep]
+
+def shellBound(reflat, deflat, d, fixed):
+    '''
+    Calculates a lower bound of the distance function of every pair with an element of absolute value d or larger,
+    when the correspondance matrix of one configuration is fixed to the identity (p/q or q/p is an integer in readCorMat)
+
+    A column p_j of the varying P with an element d gives |E p_j| >= s_min(E) d while the same column of the fixed lattice is
+    at most its longest lattice vector, so one singular value of F is at least (or 1/F at least) t = s_min(E) d / max|e_j| and
+    the distance function sum (1/lam_i^2 - 1)^2 is at least (1 - 1/t^2)^2 (or (t^2 - 1)^2), which grows with d
+
+    Parameters:
+        reflat (ndarray [shape (3, 3)]): 
+            lattice vector for the reference configuration
+        deflat (ndarray [shape (3, 3)]): 
+            lattice vector for the deformed configuration
+        d (integer):
+            smallest largest absolute element of the pairs bounded
+        fixed (string):
+            'ref' if the reference correspondance matrix is the identity, 'def' if the deformed one is, otherwise no bound exists
+
+    Returns:
+        bound (float): 
+            lower bound of the distance function, 0 if there is none
+    '''
+
+    if fixed == 'ref':
+        t = np.linalg.svd(deflat, compute_uv=False)[-1] * d / np.linalg.norm(reflat, axis=0).max()
+        return (1 - 1/t**2)**2 if t > 1 else 0.0
+    if fixed == 'def':
+        t = np.linalg.svd(reflat, compute_uv=False)[-1] * d / np.linalg.norm(deflat, axis=0).max()
+        return (t**2 - 1)**2 if t > 1 else 0.0
+
+    return 0.0
+
+def deepDist(p, q, reflat, deflat, k=3, d_max=3, depth=2, packed=False):
+    '''
+    Searches the correspondance matricies shell by shell d = 1, 2, 3, ... carrying the k minimum distance forward,
+    and stops when shellBound shows that no pair of the next shells can beat the k-th minimum distance
+
+    Parameters:
+        p (integer):
+            number of atoms/molecules in unit cell of the reference phase
+        q (integer):
+            number of atoms/molecules in unit cell of the deformed phase
+        reflat (ndarray [shape (3, 3)]): 
+            lattice vector for the reference configuration
+        deflat (ndarray [shape (3, 3)]): 
+            lattice vector for the deformed configuration
+        k (integer):
+            number of minimum distance functions kept
+        d_max (integer):
+            largest d searched if the search is not certified before
+        depth (integer):
+            number of file pairs read ahead, as in loopDist
+        packed (bool):
+            reads the bit packed correspondance matrix files
+
+    Returns:
+        distFunc_stored, U_stored, P_ref_stored, P_def_stored:
+            top k min as returned by loopDist
+        d (integer):
+            largest d searched
+        certified (bool):
+            True if the top k min is the top k min over every d
+    '''
+
+    if d_max < 1:
+        raise ValueError(f'd_max must be at least 1, got {d_max}')
+
+    results = [(np.ones((k,1)) * 1e100, np.zeros((k, 3, 3)), np.zeros((k, 3, 3)), np.zeros((k, 3, 3)))]
+    certified = False
+
+    for d in range(1, d_max + 1):
+        print(f'Searching shell d = {d}')
+
+        # Generates correspondance matricies if it doesnt exist in file
+        cm.saveCorMat(d, packed)
+        file_path, ref_files, def_files = cm.readCorMat(d, p, q, packed)
+
+        results = [mergeDist(results + [loopDist(file_path, ref_files, def_files, reflat, deflat, k, depth, shell=d)], k)]
+
+        # Checks if the next shell can beat the k-th minimum distance
+        fixed = 'ref' if all('det0' in file for file in ref_files) else 'def' if all('det0' in file for file in def_files) else None
+        bound = shellBound(reflat, deflat, d + 1, fixed)
+        kth = results[0][0][-1, 0]
+        print(f'   Shell d = {d + 1} and above: distance function >= {bound:.6e}, k-th minimum = {kth:.6e} \n')
+        if bound >= kth:
+            certified = True
+            break
+
+    if certified:
+        print(f'   COMPLETE: top {k} minimum certified at d = {d} \n')
+    elif fixed is None:
+        print(f'   COMPLETE: searched up to d = {d}, not certified since both correspondance matricies vary \n')
+    else:
+        print(f'   COMPLETE: searched up to d = {d}, not certified, increase d_max \n')
+
+    distFunc_stored, U_stored, P_ref_stored, P_def_stored = results[0]
+
+    return distFunc_stored, U_stored, P_ref_stored, P_def_stored, d, certified
+
+def saveDist(distFunc, U, P_ref, P_def, abc_ref, abc_def, angle_ref, angle_def, p=None, q=None, d=None, latt_in=None, timing=None, path=None):
     '''
     Saves the three minimum distance function and its associated stretch tensor and correspondance matrix for each configuration
 
@@ -124,9 +316,21 @@ def saveDist(distFunc, U, P_ref, P_def, abc_ref, abc_def, angle_ref, angle_def):
             correspondance matrix with distance function that is top three min
         P_def_stored (ndarray [shape (3, 3, 3)]): 
             correspondance matrix with distance function that is top three min
+        p (integer):
+            number of atoms/molecules in unit cell of the reference phase
+        q (integer):
+            number of atoms/molecules in unit cell of the deformed phase
+        d (integer):
+            maximum integer difference between the length between the unit cell parameter of the reference to transformed configuration
+        latt_in (tuple):
+            input unit cell parameters (abc_ref, angle_ref, abc_def, angle_def)
+        timing (dict):
+            wall times in seconds of the calculation steps
+        path (string):
+            path to the results table on a local disk, defaults to store.storePath()
 
     Returns:
-        int: Always returns 0 to indicate completion.
+        res_id (integer): id of the result in the results table "./calc_data/results.sqlite"
     '''
     # Prints out top 3 min distance data
     print('Saving distance minimization data')
@@ -147,71 +351,43 @@ def saveDist(distFunc, U, P_ref, P_def, abc_ref, abc_def, angle_ref, angle_def):
     print('   Unit cell parameter angle for deformed saved')
     print(' ' * 12, np.array2string(angle_def, prefix=' ' * 12), '\n')
 
-    # Saves the data with unique name
-    counter = 0
-    folder_path = os.path.join(os.getcwd(), 'calc_data')
+    # Appends the data to the results table
+    res_id = st.appendStore(distFunc, U, P_ref, P_def, abc_ref, abc_def, angle_ref, angle_def,
+                            p=p, q=q, d=d, latt_in=latt_in, timing=timing, path=path)
 
-    while True:
-        file_name = f'stored_results{counter}.npz'
-        file_path = os.path.join(folder_path, file_name)
-        if not os.path.exists(file_path):
-            break
-        counter += 1
-
-    # Makes save directory if it doesnt exist
-    if not os.path.exists(folder_path):
-        os.mkdir(folder_path)
-        
-    np.savez(file_path,
-            P_ref=P_ref,
-            P_def=P_def,
-            U=U,
-            dist=distFunc,
-            abc_ref = abc_ref, 
-            abc_def = abc_def, 
-            angle_ref = angle_ref,
-            angle_def =  angle_def)
-
-    print(f'   COMPLETE: Calculated data stored as "stored_results{counter}.npz" \n')
-
-    return 0
+    print(f'   COMPLETE: Calculated data stored in "{path or st.storePath()}" with id {res_id} \n')
+
+    return res_id
 
 def newLatt(reflat, deflat, P_ref, P_def):
     '''
-    Calculates the unit cell parameters with the lowest distance function value
+    Calculates the unit cell parameters with the lowest distance function value, for one correspondance matrix or a whole stack of them
     
     Parameters:
         reflat (ndarray [shape (3, 3)]): 
             lattice vector for the reference configuration
         reflat (ndarray [shape (3, 3)]): 
             lattice vector for the deformed configuration
-        P_ref (ndarray [shape (3, 3)]): 
-            correspondance matrix with distance function that is min
-        P_def (ndarray [shape (3, 3)]): 
-            correspondance matrix with distance function that is min
+        P_ref (ndarray [shape (*, 3, 3)]): 
+            correspondance matrix with distance function that is min, or the top k / a whole chunk of them
+        P_def (ndarray [shape (*, 3, 3)]): 
+            correspondance matrix with distance function that is min, or the top k / a whole chunk of them
 
     Returns:
-        abc_ref (ndarray [shape (1, 3)]): 
+        abc_ref (ndarray [shape (*, 3)]): 
             reference configuration unit cell parameter abc with min distance function
-        abc_def (ndarray [shape (1, 3)]): 
+        abc_def (ndarray [shape (*, 3)]): 
             deformed configuration unit cell parameter abc with min distance function
-        angle_ref (ndarray [shape (1, 3)]): 
+        angle_ref (ndarray [shape (*, 3)]): 
             reference configuration unit cell parameter angles with min distance function
-        angle_def (ndarray [shape (1, 3)]): 
+        angle_def (ndarray [shape (*, 3)]): 
             deformed configuration unit cell parameter angles with min distance function
     '''
 
     new_reflat = P_ref @ reflat
     new_deflat = P_def @ deflat
     
-    abc_ref = np.array([np.linalg.norm(new_reflat[:,0]), np.linalg.norm(new_reflat[:,1]), np.linalg.norm(new_reflat[:,2])])
-    abc_def = np.array([np.linalg.norm(new_deflat[:,0]), np.linalg.norm(new_deflat[:,1]), np.linalg.norm(new_deflat[:,2])])
-
-    angle_ref = np.array([np.degrees(np.arccos(np.dot(new_reflat[:,1].flatten(), new_reflat[:,2].flatten()) / (abc_ref[1] * abc_ref[2]))), 
-                          np.degrees(np.arccos(np.dot(new_reflat[:,0].flatten(), new_reflat[:,2].flatten()) / (abc_ref[0] * abc_ref[2]))), 
-                          np.degrees(np.arccos(np.dot(new_reflat[:,0].flatten(), new_reflat[:,1].flatten()) / (abc_ref[0] * abc_ref[1])))])
-    angle_def = np.array([np.degrees(np.arccos(np.dot(new_deflat[:,1].flatten(), new_deflat[:,2].flatten()) / (abc_def[1] * abc_def[2]))), 
-                          np.degrees(np.arccos(np.dot(new_deflat[:,0].flatten(), new_deflat[:,2].flatten()) / (abc_def[0] * abc_def[2]))), 
-                          np.degrees(np.arccos(np.dot(new_deflat[:,0].flatten(), new_deflat[:,1].flatten()) / (abc_def[0] * abc_def[1])))])
+    abc_ref, angle_ref = cr.vect2unit(new_reflat)
+    abc_def, angle_def = cr.vect2unit(new_deflat)
     
     return abc_ref, abc_def, angle_ref, angle_def
\ No newline at end of file
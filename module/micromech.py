@@ -11,6 +11,8 @@ Contact: yunsu@ucsb.edu
 
 import numpy as np
 
+from . import crystallo as cr
+
 def defgrad(reflat, deflat):
     """
     Calculates the deformation gradient from the lattice vectors of the reference and deformed configuration
@@ -72,8 +74,163 @@ def streten(F):
 
 
 def defvol(F):
-    pass
-def defare(F): 
-    pass
+    """
+    Calculates the volume change of the deformation gradient
+
+    Parameters:
+        F (ndarray [shape (*, 3, 3)]):
+            deformation gradient or stretch tensor for the material 
+
+    Returns:
+        dV (float or ndarray [shape (*)]):
+            volume change det(F) - 1
+    """
+
+    dV = np.linalg.det(F) - 1
+
+    return dV
+
+
+def defare(F, n):
+    """
+    Calculates the area change of a plane with Nanson's formula
+
+    Parameters:
+        F (ndarray [shape (*, 3, 3)]):
+            deformation gradient or stretch tensor for the material 
+        n (ndarray [shape (*, 3)]):
+            vector normal to the plane in the reference configuration
+
+    Returns:
+        dA (float or ndarray [shape (*)]):
+            area change det(F)|F^-T n|/|n| - 1
+    """
+
+    n = np.asarray(n, dtype=float)
+    Finv_n = np.linalg.solve(np.swapaxes(F, -1, -2), n[..., None])[..., 0]
+    dA = np.linalg.det(F) * np.linalg.norm(Finv_n, axis=-1) / np.linalg.norm(n, axis=-1) - 1
+
+    return dA
+
+
 def defstr(F):
-    pass
\ No newline at end of file
+    """
+    Calculates the Green-Lagrange strain tensor
+
+    Parameters:
+        F (ndarray [shape (*, 3, 3)]):
+            deformation gradient or stretch tensor for the material 
+
+    Returns:
+        E (ndarray [shape (*, 3, 3)]):
+            Green-Lagrange strain (F^T F - I)/2
+    """
+
+    E = (np.swapaxes(F, -1, -2) @ F - np.eye(3)) / 2
+
+    return E
+
+
+def habplane(U):
+    """
+    Solves the kinematic compatibility equation QU - I = b x n between the reference phase and the stretch tensor (Ball and James)
+    The solution only exists when the middle eigenvalue of U is 1, otherwise lambda2 is taken as 1 for the nearest solution
+
+    Parameters:
+        U (ndarray [shape (*, 3, 3)]):
+            stretch tensor from the deforamtion gradient (F)
+
+    Returns:
+        n (ndarray [shape (*, 3)]):
+            unit vector normal to habit plane with kappa = 1
+        n_n (ndarray [shape (*, 3)]):
+            unit vector normal to habit plane with kappa = -1
+        b (ndarray [shape (*, 3)]):
+            shape strain vector with kappa = 1
+        b_n (ndarray [shape (*, 3)]):
+            shape strain vector with kappa = -1
+    """
+
+    # Eigenvalues of C = U^T U in ascending order, lam1 <= 1 <= lam3 is clipped to keep the solution real
+    eig_val, eig_vec = np.linalg.eigh((np.swapaxes(U, -1, -2) + U) / 2)
+    lam = eig_val ** 2
+    lam1 = np.minimum(lam[..., 0], 1)[..., None]
+    lam3 = np.maximum(lam[..., 2], 1)[..., None]
+    e1 = eig_vec[..., :, 0]
+    e3 = eig_vec[..., :, 2]
+
+    # Guards the division in the lam1 = lam3 = 1 case (no transformation), where n and b are returned as zero vectors
+    gap = np.maximum(lam3 - lam1, np.finfo(float).tiny)
+
+    sols = []
+    for kappa in [1, -1]:
+        n = -np.sqrt(1 - lam1) * e1 + kappa * np.sqrt(lam3 - 1) * e3
+        b = np.sqrt(lam3 * (1 - lam1) / gap) * e1 + kappa * np.sqrt(lam1 * (lam3 - 1) / gap) * e3
+
+        # rho is chosen so that |n| = 1
+        rho = (np.sqrt(lam3) - np.sqrt(lam1)) / np.sqrt(gap) * np.linalg.norm(n, axis=-1, keepdims=True)
+        n = n / np.maximum(np.linalg.norm(n, axis=-1, keepdims=True), np.finfo(float).tiny)
+        sols.append((n, rho * b))
+
+    (n, b), (n_n, b_n) = sols
+
+    return n, n_n, b, b_n
+
+
+def rankcomp(U, milvec=None, key=('lam2_dev', 'vol_dev', 'theta')):
+    """
+    Calculates the kinematic compatibility metrics of a stack of stretch tensors and ranks them
+
+    Parameters:
+        U (ndarray [shape (N, 3, 3)]):
+            stretch tensors, e.g. the top k from the distance minimization
+        milvec (ndarray [shape (M, 3)]):
+            experimental vectors normal to habit plane in the Cartesian frame of the reference lattice (crystallo.mil2norm)
+        key (tuple):
+            metrics to rank by, each metric is ranked separately and the candidates are ordered by the sum of ranks
+            with ties broken by the first metric
+
+    Returns:
+        order (ndarray [shape (N,)]):
+            indices of U from most to least compatible
+        metrics (dict):
+            lam (N, 3) ascending eigenvalues of U
+            lam2_dev (N,) |lambda2 - 1|
+            vol_dev (N,) |det(U) - 1|
+            n, n_n, b, b_n (N, 3) habit plane solutions for kappa = 1 and -1
+            theta (N,) minimum angle to the experimental habit planes, only if milvec is given
+            theta_all (N, M) minimum angle to each experimental habit plane, only if milvec is given
+            mil_idx (N,) index of the experimental habit plane with the minimum angle, only if milvec is given
+            theta is nan and mil_idx is -1 for the candidates without a habit plane (U = I), which are ordered last
+    """
+
+    U = np.asarray(U, dtype=float)
+
+    lam = np.linalg.eigvalsh((np.swapaxes(U, -1, -2) + U) / 2)
+    metrics = {'lam': lam,
+               'lam2_dev': np.abs(lam[:, 1] - 1),
+               'vol_dev': np.abs(defvol(U))}
+
+    metrics['n'], metrics['n_n'], metrics['b'], metrics['b_n'] = habplane(U)
+
+    # Candidates without a habit plane have zero length n
+    valid = (np.linalg.norm(metrics['n'], axis=-1) > 0) & (np.linalg.norm(metrics['n_n'], axis=-1) > 0)
+
+    # Minimum angle to every experimental habit plane at once
+    if milvec is not None:
+        milvec = np.atleast_2d(milvec)
+
+        # Candidates without a habit plane are left as nan
+        theta_all = np.full((U.shape[0], milvec.shape[0]), np.nan)
+        theta_all[valid] = cr.minang(metrics['n'][valid, None, :], metrics['n_n'][valid, None, :], milvec[None, :, :])
+
+        metrics['theta_all'] = theta_all
+        metrics['mil_idx'] = np.full(U.shape[0], -1)
+        metrics['mil_idx'][valid] = np.argmin(theta_all[valid], axis=1)
+        metrics['theta'] = np.min(theta_all, axis=1)
+
+    key = [k for k in key if k in metrics]
+    ranks = sum(np.argsort(np.argsort(metrics[k], kind='stable'), kind='stable') for k in key)
+    order = np.lexsort((metrics[key[0]], ranks, ~valid))
+
+    return order, metrics
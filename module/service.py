@@ -0,0 +1,279 @@
+'''
+service.py
+
+Service module contains functions for a long running solver that keeps the correspondance matricies in memory and serves
+distance minimization requests as JSON over HTTP, on a TCP port or a local Unix socket
+
+Requests
+    POST /solve     {"abc_ref": [...], "angle_ref": [...], "abc_def": [...], "angle_def": [...], "p": 2, "q": 1, "d": 2, "k": 3, "save": false}
+    GET  /status    loaded d and number of correspondance matricies
+
+Author: Yunsu Park
+Created: October 19 2026
+Affiliation: University of California, Santa Barbara
+Contact: yunsu@ucsb.edu
+'''
+
+import numpy as np
+import os as os
+import json as json
+import time as time
+import socket as socket
+import threading as th
+import http.client as hc
+import http.server as hs
+import socketserver as ss
+import concurrent.futures as cf
+
+from . import corrmat as cm
+from . import distmin as dm
+from . import crystallo as cr
+from . import store as st
+
+# Correspondance matricies of each d, kept for the lifetime of the service
+DATA = {}
+DATA_LOCK = th.Lock()
+
+# One lock per d so loading a d does not hold up the requests of the other d
+LOAD_LOCKS = {}
+
+def dataPath(d):
+    '''
+    Finds the correspondance matrix files of d, the int8 files if they exist and the bit packed files otherwise
+
+    Returns:
+        file_path (string): directory of the files
+        packed (bool): True if the files are bit packed
+    '''
+    file_path = os.path.join(os.getcwd(), 'data', f'data_d{d}')
+    if os.path.isdir(file_path):
+        return file_path, False
+    return f'{file_path}_packed', True
+
+def loadData(d, generate=False):
+    '''
+    Loads every correspondance matrix file of d into memory once, bit packed files are unpacked while they are read
+
+    Parameters:
+        d (integer):
+            maximum integer difference between the length between the unit cell parameter of the reference to transformed configuration
+        generate (bool):
+            generates the files if they dont exist, only used for the preloaded d since the generation takes long
+
+    Returns:
+        data (dict):
+            correspondance matricies of each file name
+    '''
+    # Already loaded d are served without waiting on any lock
+    data = DATA.get(d)
+    if data is not None:
+        return data
+
+    with DATA_LOCK:
+        load_lock = LOAD_LOCKS.setdefault(d, th.Lock())
+
+    with load_lock:
+        if d not in DATA:
+            if generate and not os.path.isdir(dataPath(d)[0]):
+                cm.saveCorMat(d)
+            file_path, _ = dataPath(d)
+            if not os.path.isdir(file_path):
+                raise ValueError(f'No correspondance matrix files for d = {d}, start the service with it preloaded')
+            files = sorted(file for file in os.listdir(file_path) if file.endswith('.npy'))
+            data = {file: P.copy() for (file,), (P,) in cm.prefetchCorMat(file_path, [(file,) for file in files])}
+            with DATA_LOCK:
+                DATA[d] = data
+            print(f'   COMPLETE: {len(files)} files of d = {d} loaded into memory \n')
+
+    return DATA[d]
+
+def solveReq(req, k_max=1000):
+    '''
+    Finds the k minimum distance for one request with the correspondance matricies in memory
+
+    Parameters:
+        req (dict):
+            abc_ref, angle_ref, abc_def, angle_def, p, q, d, optional k (default 3) and save (default False) to append the result to the results table
+        k_max (integer):
+            largest k served, since the top k arrays are allocated for every file pair
+
+    Returns:
+        res (dict):
+            dist, U, P_ref, P_def, abc_ref, abc_def, angle_ref, angle_def of the top k min as lists, runtime in seconds and id if saved
+    '''
+    t0 = time.perf_counter()
+
+    p, q, d, k = req['p'], req['q'], req['d'], req.get('k', 3)
+    for name, val in zip(['p', 'q', 'd', 'k'], [p, q, d, k]):
+        if isinstance(val, bool) or not isinstance(val, int) or val < 1:
+            raise ValueError(f'{name} must be a positive integer, got {val!r}')
+    if k > k_max:
+        raise ValueError(f'k must be at most {k_max}, got {k}')
+
+    latt_in = [np.array(req[key], dtype=float) for key in ['abc_ref', 'angle_ref', 'abc_def', 'angle_def']]
+    for key, val in zip(['abc_ref', 'angle_ref', 'abc_def', 'angle_def'], latt_in):
+        if val.shape != (3,) or not np.all(np.isfinite(val)):
+            raise ValueError(f'{key} must be 3 finite numbers, got shape {val.shape}')
+    reflat = cr.unit2vect(latt_in[0], latt_in[1])
+    deflat = cr.unit2vect(latt_in[2], latt_in[3])
+
+    data = loadData(d)
+    _, ref_files, def_files = cm.readCorMat(d, p, q, dataPath(d)[1])
+
+    results = [dm.tileDist(data[ref_file], data[def_file], reflat, deflat, k) for ref_file in ref_files for def_file in def_files]
+    distFunc, U, P_ref, P_def = dm.mergeDist(results, k)
+    abc_ref, abc_def, angle_ref, angle_def = dm.newLatt(reflat, deflat, P_ref, P_def)
+
+    res = {'dist': distFunc, 'U': U, 'P_ref': P_ref, 'P_def': P_def,
+           'abc_ref': abc_ref, 'abc_def': abc_def, 'angle_ref': angle_ref, 'angle_def': angle_def}
+    res = {key: val.tolist() for key, val in res.items()}
+    res['runtime'] = time.perf_counter() - t0
+
+    if req.get('save', False):
+        res['id'] = st.appendStore(distFunc, U, P_ref, P_def, abc_ref, abc_def, angle_ref, angle_def,
+                                   p=p, q=q, d=d, latt_in=(latt_in[0], latt_in[1], latt_in[2], latt_in[3]),
+                                   timing={'solveReq': res['runtime']})
+
+    return res
+
+class SolveHandler(hs.BaseHTTPRequestHandler):
+    '''
+    Handles the HTTP requests of the service, the solves run on the worker pool of the server
+    '''
+
+    def reply(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != '/status':
+            return self.reply(404, {'error': f'unknown path {self.path}'})
+        with DATA_LOCK:
+            loaded = dict(DATA)
+        self.reply(200, {'loaded': {d: sum(P.shape[0] for P in data.values()) for d, data in loaded.items()}})
+
+    def do_POST(self):
+        if self.path != '/solve':
+            return self.reply(404, {'error': f'unknown path {self.path}'})
+        try:
+            req = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            res = self.server.pool.submit(solveReq, req, self.server.k_max).result()
+        except (KeyError, ValueError, TypeError) as err:
+            return self.reply(400, {'error': f'{type(err).__name__}: {err}'})
+        except Exception as err:
+            return self.reply(500, {'error': f'{type(err).__name__}: {err}'})
+        self.reply(200, res)
+
+    def address_string(self):
+        # Unix socket clients have no host and port
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+class UnixHTTPServer(hs.ThreadingHTTPServer):
+    '''
+    HTTP server on a local Unix socket
+    '''
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        ss.TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+class UnixHTTPConnection(hc.HTTPConnection):
+    '''
+    HTTP client connection to a local Unix socket
+    '''
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.sock_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.sock_path)
+
+def runServer(address, workers=None, preload=(), k_max=1000):
+    '''
+    Runs the solver service until interrupted
+
+    Parameters:
+        address (string or tuple):
+            path of the Unix socket, or (host, port) for TCP
+        workers (integer):
+            number of requests solved at the same time, the number of CPUs if None
+        preload (list [shape (*, 1)]):
+            d loaded into memory before the first request, generated if they dont exist,
+            other d are only served if their files already exist
+        k_max (integer):
+            largest k of a request, larger k are refused so one request cannot use up the memory of the service
+
+    Returns:
+        int: Always returns 0 to indicate completion.
+    '''
+
+    for d in preload:
+        loadData(d, generate=True)
+
+    if isinstance(address, str):
+        server = UnixHTTPServer(address, SolveHandler)
+    else:
+        server = hs.ThreadingHTTPServer(tuple(address), SolveHandler)
+    server.pool = cf.ThreadPoolExecutor(max_workers=workers or os.cpu_count())
+    server.k_max = k_max
+
+    print(f'Solver service listening on {address}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.pool.shutdown()
+        if isinstance(address, str) and os.path.exists(address):
+            os.remove(address)
+
+    return 0
+
+def sendReq(req, address, path='/solve', timeout=None):
+    '''
+    Sends a request to the solver service
+
+    Parameters:
+        req (dict):
+            request as in solveReq, None for a GET request
+        address (string or tuple):
+            path of the Unix socket, or (host, port) for TCP
+        path (string):
+            /solve or /status
+        timeout (float):
+            seconds waited for the reply, forever if None
+
+    Returns:
+        res (dict): reply of the service
+    '''
+
+    if isinstance(address, str):
+        conn = UnixHTTPConnection(address, timeout=timeout)
+    else:
+        conn = hc.HTTPConnection(*address, timeout=timeout)
+
+    try:
+        if req is None:
+            conn.request('GET', path)
+        else:
+            conn.request('POST', path, body=json.dumps(req), headers={'Content-Type': 'application/json'})
+        reply = conn.getresponse()
+        res = json.loads(reply.read())
+    finally:
+        conn.close()
+
+    if reply.status != 200:
+        raise RuntimeError(f'Solver service replied {reply.status}: {res.get("error")}')
+
+    return res
@@ -0,0 +1,258 @@
+'''
+store.py
+
+Store module contains functions for saving and reading back the distance minimization results in a single indexed results table
+
+Concurrent writers are only safe on a single host: the table relies on SQLite file locking, which is not reliable over NFS
+and other network filesystems, so the table must be on a disk local to the node that writes it. Jobs on several nodes
+each write a table on their own node (DISTMIN_STORE), and a queue run over a shared filesystem is only written by its reducer
+
+Author: Yunsu Park
+Created: October 19 2026
+Affiliation: University of California, Santa Barbara
+Contact: yunsu@ucsb.edu
+'''
+
+import numpy as np
+import os as os
+import io as io
+import json as json
+import time as time
+import sqlite3 as sqlite3
+
+# Scalar input columns, indexed so that a query does not scan the table
+INPUT_COLS = ['p', 'q', 'd',
+              'a_ref', 'b_ref', 'c_ref', 'alp_ref', 'bet_ref', 'gam_ref',
+              'a_def', 'b_def', 'c_def', 'alp_def', 'bet_def', 'gam_def']
+
+# Array columns, stored as .npy blobs so dtype and shape are kept
+ARRAY_COLS = ['dist', 'U', 'P_ref', 'P_def',
+              'abc_ref', 'abc_def', 'angle_ref', 'angle_def']
+
+SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL,
+    p INTEGER, q INTEGER, d INTEGER, k INTEGER,
+    {', '.join(f'{col} REAL' for col in INPUT_COLS[3:])},
+    dist_min REAL,
+    runtime REAL,
+    timing TEXT,
+    {', '.join(f'{col} BLOB' for col in ARRAY_COLS)}
+);
+CREATE INDEX IF NOT EXISTS results_inputs ON results ({', '.join(INPUT_COLS)});
+'''
+
+def storePath():
+    '''
+    Determines the path of the results table which will be "./calc_data/results.sqlite", or the DISTMIN_STORE environment variable if set
+
+    Returns:
+        path (string):
+            path to the results table
+    '''
+
+    return os.environ.get('DISTMIN_STORE') or os.path.join(os.getcwd(), 'calc_data', 'results.sqlite')
+
+def openStore(path=None):
+    '''
+    Opens the results table and creates it if it doesnt exist, the table must be on a local disk
+    since SQLite locking is not reliable over NFS and other network filesystems
+
+    Parameters:
+        path (string):
+            path to the results table, defaults to storePath()
+
+    Returns:
+        conn (sqlite3.Connection):
+            connection to the results table
+    '''
+
+    if path is None:
+        path = storePath()
+
+    # Makes save directory if it doesnt exist
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Concurrent writers wait on the database lock instead of failing,
+    # the lock is only reliable on a local disk so on a cluster only the reducer of workqueue writes the table
+    conn = sqlite3.connect(path, timeout=600)
+    conn.executescript(SCHEMA)
+
+    return conn
+
+def arr2blob(arr):
+    '''
+    Serializes an array to bytes in .npy format
+    '''
+    buf = io.BytesIO()
+    np.save(buf, np.asarray(arr), allow_pickle=False)
+    return buf.getvalue()
+
+def blob2arr(blob):
+    '''
+    Deserializes bytes in .npy format to an array
+    '''
+    return np.load(io.BytesIO(blob), allow_pickle=False)
+
+def appendStore(distFunc, U, P_ref, P_def, abc_ref, abc_def, angle_ref, angle_def,
+                p=None, q=None, d=None, latt_in=None, timing=None, path=None):
+    '''
+    Appends one distance minimization result to the results table as a single atomic transaction
+
+    Parameters:
+        distFunc (ndarray [shape (k, 1)]):
+            distance function that is top k min
+        U (ndarray [shape (k, 3, 3)]):
+            stretch tensor with distance function that is top k min
+        P_ref (ndarray [shape (k, 3, 3)]):
+            correspondance matrix of the reference configuration with distance function that is top k min
+        P_def (ndarray [shape (k, 3, 3)]):
+            correspondance matrix of the deformed configuration with distance function that is top k min
+        abc_ref, abc_def, angle_ref, angle_def (ndarray):
+            reduced unit cell parameters from newLatt
+        p (integer):
+            number of atoms/molecules in unit cell of the reference phase
+        q (integer):
+            number of atoms/molecules in unit cell of the deformed phase
+        d (integer):
+            maximum integer of the correspondance matrix searched
+        latt_in (tuple):
+            input unit cell parameters (abc_ref, angle_ref, abc_def, angle_def)
+        timing (dict):
+            wall times in seconds of the calculation steps, the sum is stored as the runtime
+        path (string):
+            path to the results table, defaults to storePath()
+
+    Returns:
+        res_id (integer):
+            id of the appended result
+    '''
+
+    if latt_in is None:
+        inputs = [None] * 12
+    else:
+        inputs = [float(x) for x in np.concatenate([np.ravel(x) for x in latt_in])]
+
+    dist = np.asarray(distFunc)
+    runtime = None if timing is None else float(sum(timing.values()))
+
+    row = {'created': time.time(),
+           'p': p, 'q': q, 'd': d, 'k': int(dist.shape[0]),
+           **dict(zip(INPUT_COLS[3:], inputs)),
+           'dist_min': float(np.min(dist)),
+           'runtime': runtime,
+           'timing': None if timing is None else json.dumps(timing)}
+    arrays = [distFunc, U, P_ref, P_def, abc_ref, abc_def, angle_ref, angle_def]
+    row.update({col: arr2blob(arr) for col, arr in zip(ARRAY_COLS, arrays)})
+
+    conn = openStore(path)
+    try:
+        # BEGIN IMMEDIATE takes the write lock up front so concurrent appends serialize
+        conn.execute('BEGIN IMMEDIATE')
+        cur = conn.execute(f'INSERT INTO results ({", ".join(row)}) VALUES ({", ".join("?" * len(row))})',
+                           list(row.values()))
+        conn.commit()
+        res_id = cur.lastrowid
+    finally:
+        conn.close()
+
+    return res_id
+
+def queryStore(p=None, q=None, d=None, abc_ref=None, angle_ref=None, abc_def=None, angle_def=None,
+               tol=1e-4, path=None):
+    '''
+    Finds the results matching the given input parameters, parameters left as None match anything
+
+    Parameters:
+        p, q, d (integer):
+            input p, q and d to match exactly
+        abc_ref, angle_ref, abc_def, angle_def (ndarray [shape (1, 3)]):
+            input unit cell parameters to match within tol
+        tol (float):
+            absolute tolerance of the unit cell parameter match
+        path (string):
+            path to the results table, defaults to storePath()
+
+    Returns:
+        table (dict):
+            columns id, created, p, q, d, k, the input unit cell parameters, dist_min, runtime of the matching results as ndarrays
+    '''
+
+    where = []
+    args = []
+    for col, val in zip(['p', 'q', 'd'], [p, q, d]):
+        if val is not None:
+            where.append(f'{col} = ?')
+            args.append(int(val))
+    for cols, vals in zip([INPUT_COLS[3:6], INPUT_COLS[6:9], INPUT_COLS[9:12], INPUT_COLS[12:15]],
+                          [abc_ref, angle_ref, abc_def, angle_def]):
+        if vals is not None:
+            for col, val in zip(cols, np.ravel(vals)):
+                where.append(f'{col} BETWEEN ? AND ?')
+                args.extend([float(val) - tol, float(val) + tol])
+
+    cols = ['id', 'created', *INPUT_COLS, 'k', 'dist_min', 'runtime']
+    sql = f'SELECT {", ".join(cols)} FROM results'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY id'
+
+    conn = openStore(path)
+    try:
+        rows = conn.execute(sql, args).fetchall()
+    finally:
+        conn.close()
+
+    # Integer columns stay integer unless a result was appended without them
+    table = {}
+    for i, col in enumerate(cols):
+        vals = [row[i] for row in rows]
+        is_int = col in ['id', 'p', 'q', 'd', 'k'] and None not in vals
+        table[col] = np.array(vals, dtype=int if is_int else float)
+
+    return table
+
+def loadStore(res_ids, path=None):
+    '''
+    Loads the stored arrays of the given results
+
+    Parameters:
+        res_ids (list [shape (*, 1)]):
+            ids of the results, as returned by queryStore or appendStore
+        path (string):
+            path to the results table, defaults to storePath()
+
+    Returns:
+        table (dict):
+            columns id, timing and the array columns dist, U, P_ref, P_def, abc_ref, abc_def, angle_ref, angle_def,
+            array columns are stacked along the first axis when every result has the same shape and listed otherwise
+    '''
+
+    res_ids = [int(i) for i in np.ravel(res_ids)]
+
+    conn = openStore(path)
+    try:
+        rows = {}
+        # Chunks the id list to stay under the SQLite bound parameter limit
+        for i in range(0, len(res_ids), 500):
+            ids = res_ids[i:i+500]
+            sql = f'SELECT id, timing, {", ".join(ARRAY_COLS)} FROM results WHERE id IN ({", ".join("?" * len(ids))})'
+            rows.update({row[0]: row for row in conn.execute(sql, ids)})
+    finally:
+        conn.close()
+
+    missing = [i for i in res_ids if i not in rows]
+    if missing:
+        raise KeyError(f'No stored results with id {missing}')
+
+    table = {'id': np.array(res_ids, dtype=int),
+             'timing': [None if rows[i][1] is None else json.loads(rows[i][1]) for i in res_ids]}
+    for j, col in enumerate(ARRAY_COLS):
+        arrs = [blob2arr(rows[i][j+2]) for i in res_ids]
+        if arrs and all(arr.shape == arrs[0].shape for arr in arrs):
+            table[col] = np.stack(arrs)
+        else:
+            table[col] = arrs
+
+    return table
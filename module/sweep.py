@@ -0,0 +1,216 @@
+'''
+sweep.py
+
+Sweep module contains functions for the distance minimization of one phase pair over a series of unit cell parameters, e.g. a temperature or pressure series,
+where every point after the first is warm started from the minimum of the previous point
+
+Author: Yunsu Park
+Created: October 19 2026
+Affiliation: University of California, Santa Barbara
+Contact: yunsu@ucsb.edu
+'''
+
+import numpy as np
+import time as time
+
+from . import corrmat as cm
+from . import distmin as dm
+from . import crystallo as cr
+
+# Order of the 6 independent elements of a symmetric 3x3 matrix
+SYM_IDX = [(0, 0), (1, 1), (2, 2), (0, 1), (0, 2), (1, 2)]
+
+def sym2mat(sym):
+    '''
+    Converts the 6 independent elements (00, 11, 22, 01, 02, 12) of symmetric matricies to the matricies
+    '''
+    sym = np.asarray(sym)
+    mat = np.empty((*sym.shape[:-1], 3, 3), dtype=sym.dtype)
+    for n, (a, b) in enumerate(SYM_IDX):
+        mat[..., a, b] = mat[..., b, a] = sym[..., n]
+    return mat
+
+def metMap(P):
+    '''
+    Calculates the linear map from the metric tensor M of a lattice to the metric tensor P^T M P of the new lattice,
+    which only depends on the correspondance matrix and so is calculated once per file for the whole sweep
+
+    Parameters:
+        P (ndarray [shape (N, 3, 3)]):
+            correspondance matricies
+
+    Returns:
+        Z (ndarray [shape (N, 6, 6)]):
+            integer map with sym(P^T M P) = Z @ sym(M) in the element order of sym2mat
+    '''
+    P = np.asarray(P, dtype=np.int16)
+    Z = np.empty((P.shape[0], 6, 6), dtype=np.int16)
+    for i, (a, b) in enumerate(SYM_IDX):
+        for j, (c, d) in enumerate(SYM_IDX):
+            # (P^T M P)_ab = sum_cd P_ca M_cd P_db with M_cd = M_dc counted once
+            Z[:, i, j] = P[:, c, a] * P[:, d, b]
+            if c != d:
+                Z[:, i, j] += P[:, d, a] * P[:, c, b]
+    return Z
+
+def pruneDist(tiles, reflat, deflat, k=3, thr=np.inf, block=2**17):
+    '''
+    Finds the k minimum distance of every tile of correspondance matricies while skipping the pairs that cannot beat thr or the running k-th minimum
+
+    The ratios of the diagonal metric elements r_j = |E_def P_def e_j|^2 / |E_ref P_ref e_j|^2 bound the singular values of F,
+    so the distance function is at least (1 - 1/max r)^2 [if max r > 1] + (1/min r - 1)^2 [if min r < 1],
+    and only the pairs with a lower bound under the threshold are calculated with the quadratic form of distmin.tileDist
+
+    Parameters:
+        tiles (list [shape (*, 1)]):
+            tuples of (P_ref, Z_ref, P_def, Z_def) with the metMap of each stack of correspondance matricies
+        reflat (ndarray [shape (3, 3)]):
+            lattice vector for the reference configuration
+        deflat (ndarray [shape (3, 3)]):
+            lattice vector for the deformed configuration
+        k (integer):
+            number of minimum distance functions kept
+        thr (float):
+            upper bound of the k-th minimum distance, e.g. from candidates of a previous point
+        block (integer):
+            maximum number of pairs bounded at once
+
+    Returns:
+        distFunc_stored, U_stored, P_ref_stored, P_def_stored:
+            top k min as returned by distmin.loopDist
+        n_scored (integer):
+            number of pairs whose distance function was calculated
+    '''
+
+    m_ref = (reflat.T @ reflat)[tuple(zip(*SYM_IDX))]
+    m_def = (deflat.T @ deflat)[tuple(zip(*SYM_IDX))]
+
+    # Running top k as (distance, tile, reference row, deformed row)
+    best = np.empty((0, 4))
+    n_scored = 0
+
+    for t, (P_ref, Z_ref, P_def, Z_def) in enumerate(tiles):
+        # Only the diagonal metric elements are needed for the bound
+        S_diag = Z_ref[:, :3] @ m_ref
+        H_diag = Z_def[:, :3] @ m_def
+        K = np.linalg.inv(sym2mat(Z_def @ m_def)).reshape(-1, 9)
+
+        nd = K.shape[0]
+        rows = max(1, block // max(nd, 1))
+        for r0 in range(0, S_diag.shape[0], rows):
+            r1 = min(r0 + rows, S_diag.shape[0])
+
+            # Lower bound of every pair of the block
+            ratio = [H_diag[None, :, a] / S_diag[r0:r1, None, a] for a in range(3)]
+            r_max = np.maximum(np.maximum(ratio[0], ratio[1]), ratio[2])
+            r_min = np.minimum(np.minimum(ratio[0], ratio[1]), ratio[2])
+            bound = np.where(r_max > 1, (1 - 1/r_max)**2, 0) + np.where(r_min < 1, (1/r_min - 1)**2, 0)
+
+            cut = min(thr, best[-1, 0]) if best.shape[0] == k else thr
+            keep = bound <= cut
+            n_keep = np.count_nonzero(keep)
+            if n_keep == 0:
+                continue
+            n_scored += n_keep
+
+            # Distance function tr(KSKS) - 2 tr(KS) + 3 as in distmin.tileDist for the rows with a remaining pair
+            rows_keep = np.nonzero(keep.any(axis=1))[0]
+            S_mat = sym2mat(Z_ref[r0 + rows_keep] @ m_ref)
+            T = np.einsum('nbc,nda->nabcd', S_mat, S_mat).reshape(-1, 9, 9)
+            dist = np.einsum('rdx,dx->rd', K[None] @ T, K) - 2 * S_mat.reshape(-1, 9) @ K.T + 3
+
+            i, j = np.nonzero(keep[rows_keep])
+            dist = dist[i, j]
+            i = rows_keep[i]
+
+            cand = np.concatenate([best, np.stack([dist, np.full(dist.shape, t), r0 + i, j], axis=1)])
+            if cand.shape[0] > k:
+                cand = cand[np.argpartition(cand[:, 0], k - 1)[:k]]
+            best = cand[np.argsort(cand[:, 0], kind='stable')]
+
+    # Recalculates the top k with calcDist for the stretch tensor
+    P_ref_stored = np.zeros((k, 3, 3))
+    P_def_stored = np.zeros((k, 3, 3))
+    distFunc_stored = np.ones((k,1)) * 1e100
+    U_stored = np.zeros((k, 3, 3))
+    for n, (_, t, i, j) in enumerate(best):
+        P_ref_stored[n] = tiles[int(t)][0][int(i)]
+        P_def_stored[n] = tiles[int(t)][2][int(j)]
+        distFunc_stored[n], U_stored[n] = dm.calcDist(reflat, deflat, P_ref_stored[n], P_def_stored[n])
+
+    return distFunc_stored, U_stored, P_ref_stored, P_def_stored, n_scored
+
+def sweepDist(p, q, d, latt_list, k=3, n_warm=None, depth=2, packed=False):
+    '''
+    Finds the k minimum distance for every unit cell parameter set of a series, the first exhaustively and the others warm started:
+    the n_warm minimum of the previous point are recalculated with the new lattices and the n_warm-th of them bounds the full search
+
+    Parameters:
+        p (integer):
+            number of atoms/molecules in unit cell of the reference phase
+        q (integer):
+            number of atoms/molecules in unit cell of the deformed phase
+        d (integer):
+            maximum integer difference between the length between the unit cell parameter of the reference to transformed configuration
+        latt_list (list [shape (*, 1)]):
+            tuples of unit cell parameters (abc_ref, angle_ref, abc_def, angle_def) of each point
+        k (integer):
+            number of minimum distance functions kept
+        n_warm (integer):
+            number of candidates carried to the next point, at least k
+        depth (integer):
+            number of file pairs read ahead while the files are first read, as in distmin.loopDist
+        packed (bool):
+            reads the bit packed correspondance matrix files
+
+    Returns:
+        table (dict):
+            per point columns dist (n, k, 1), U, P_ref, P_def (n, k, 3, 3), abc_ref, abc_def, angle_ref, angle_def (n, k, 3)
+            of the reduced cells, n_scored (n,) number of pairs calculated, n_pairs (n,) number of pairs, runtime (n,) in seconds
+    '''
+
+    n_warm = k if n_warm is None else max(n_warm, k)
+
+    # Generates correspondance matricies if it doesnt exist in file
+    cm.saveCorMat(d, packed)
+    file_path, ref_files, def_files = cm.readCorMat(d, p, q, packed)
+
+    # Reads every file once and keeps it with its metric map for the whole sweep
+    print('Reading correspondance matrix files for the sweep')
+    files = list(dict.fromkeys(ref_files + def_files))
+    data = {}
+    for (file,), (P,) in cm.prefetchCorMat(file_path, [(file,) for file in files], depth):
+        P = P.copy()
+        data[file] = (P, metMap(P))
+    tiles = [(*data[ref_file], *data[def_file]) for ref_file in ref_files for def_file in def_files]
+    n_pairs = sum(tile[0].shape[0] * tile[2].shape[0] for tile in tiles)
+
+    table = {col: [] for col in ['dist', 'U', 'P_ref', 'P_def', 'abc_ref', 'abc_def', 'angle_ref', 'angle_def',
+                                 'n_scored', 'n_pairs', 'runtime']}
+    warm = None
+    for n, (abc_ref, angle_ref, abc_def, angle_def) in enumerate(latt_list):
+        t0 = time.perf_counter()
+        reflat = cr.unit2vect(abc_ref, angle_ref)
+        deflat = cr.unit2vect(abc_def, angle_def)
+
+        # Candidates of the previous point recalculated with the new lattices bound the n_warm-th minimum
+        thr = np.inf
+        if warm is not None and warm[0].shape[0] == n_warm:
+            thr = max(dm.calcDist(reflat, deflat, P_ref, P_def)[0] for P_ref, P_def in zip(*warm))
+
+        distFunc, U, P_ref, P_def, n_scored = pruneDist(tiles, reflat, deflat, n_warm, thr)
+        warm = (P_ref[distFunc[:, 0] < 1e100], P_def[distFunc[:, 0] < 1e100])
+        abc_ref_new, abc_def_new, angle_ref_new, angle_def_new = dm.newLatt(reflat, deflat, P_ref[:k], P_def[:k])
+
+        for col, val in zip(table, [distFunc[:k], U[:k], P_ref[:k], P_def[:k],
+                                    abc_ref_new, abc_def_new, angle_ref_new, angle_def_new,
+                                    n_scored, n_pairs, time.perf_counter() - t0]):
+            table[col].append(val)
+
+        print(f'   Point {n}: minimum distance function {distFunc[0, 0]:.6e}, '
+              f'{n_scored}/{n_pairs} pairs calculated in {table["runtime"][-1]:.2f} s')
+
+    table = {col: np.array(val) for col, val in table.items()}
+    print(f'   COMPLETE: sweep of {len(latt_list)} points \n')
+
+    return table
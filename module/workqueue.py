@@ -0,0 +1,347 @@
+'''
+workqueue.py
+
+Workqueue module contains functions for splitting the distance minimization into tiles that workers on any node claim through a shared filesystem
+
+The queue directory holds
+    manifest.json       input of the calculation, the run id and the list of tiles
+    todo/               tiles not claimed yet
+    claimed/            tiles being calculated, the file modification time is the lease of the worker
+    done/               tiles with a saved fragment
+    frags/              top k min of each tile
+Every state change is a rename so exactly one worker wins a tile, and tiles whose lease expired are moved back to todo/
+The run id is a hash of the manifest and is carried by every tile and fragment, so nothing left from an earlier run of the same queue directory is used
+
+Author: Yunsu Park
+Created: October 19 2026
+Affiliation: University of California, Santa Barbara
+Contact: yunsu@ucsb.edu
+'''
+
+import numpy as np
+import os as os
+import json as json
+import time as time
+import hashlib as hashlib
+import socket as socket
+import multiprocessing as mp
+
+from . import corrmat as cm
+from . import distmin as dm
+
+def writeAtomic(path, write):
+    '''
+    Writes a file under a temporary name and renames it into place so readers never see a partial file
+
+    Parameters:
+        path (string):
+            final path of the file
+        write (function):
+            called with the opened binary file object
+    '''
+    tmp_path = f'{path}.{socket.gethostname()}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def makeQueue(queue_dir, d, p, q, reflat, deflat, k=3, tile_rows=20000, packed=False, clear=False):
+    '''
+    Writes the manifest and the tiles of (ref_file, def_file, row range) over the correspondance matrix files of d
+    into an empty queue directory
+
+    Parameters:
+        queue_dir (string):
+            directory of the queue on the shared filesystem
+        d (integer):
+            maximum integer difference between the length between the unit cell parameter of the reference to transformed configuration
+        p (integer):
+            number of atoms/molecules in unit cell of the reference phase
+        q (integer):
+            number of atoms/molecules in unit cell of the deformed phase
+        reflat (ndarray [shape (3, 3)]):
+            lattice vector for the reference configuration
+        deflat (ndarray [shape (3, 3)]):
+            lattice vector for the deformed configuration
+        k (integer):
+            number of minimum distance functions kept
+        tile_rows (integer):
+            maximum number of rows of each file in one tile
+        packed (bool):
+            tiles the bit packed correspondance matrix files, which the workers unpack while reading
+        clear (bool):
+            removes the manifest, tiles and fragments of an earlier run, otherwise a queue directory that is not empty is refused
+
+    Returns:
+        n_tiles (integer): number of tiles written
+    '''
+
+    subs = ['todo', 'claimed', 'done', 'frags']
+    old = [os.path.join(queue_dir, sub, name) for sub in subs if os.path.isdir(os.path.join(queue_dir, sub))
+           for name in os.listdir(os.path.join(queue_dir, sub))]
+    if os.path.exists(os.path.join(queue_dir, 'manifest.json')):
+        old.append(os.path.join(queue_dir, 'manifest.json'))
+    if old and not clear:
+        raise FileExistsError(f'Queue directory "{queue_dir}" holds {len(old)} files of an earlier run, use clear=True to remove them')
+
+    # The manifest is removed first so a worker of the earlier run finds no new tiles until the new manifest is written
+    for path in old[::-1]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    file_path, ref_files, def_files = cm.readCorMat(d, p, q, packed)
+
+    # Only the headers are read to find the number of rows
+    rows = {file: np.load(os.path.join(file_path, file), mmap_mode='r').shape[0] for file in set(ref_files + def_files)}
+
+    manifest = {'d': d, 'p': p, 'q': q, 'k': k,
+                'file_path': file_path,
+                'reflat': np.asarray(reflat).tolist(),
+                'deflat': np.asarray(deflat).tolist(),
+                'created': time.time()}
+    run = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:16]
+
+    tiles = []
+    for ref_file in ref_files:
+        for def_file in def_files:
+            for r0 in range(0, rows[ref_file], tile_rows):
+                for d0 in range(0, rows[def_file], tile_rows):
+                    tiles.append({'tile': f'tile_{run}_{len(tiles):06d}',
+                                  'run': run,
+                                  'ref_file': ref_file,
+                                  'ref_rows': [r0, min(r0 + tile_rows, rows[ref_file])],
+                                  'def_file': def_file,
+                                  'def_rows': [d0, min(d0 + tile_rows, rows[def_file])]})
+
+    for sub in subs:
+        os.makedirs(os.path.join(queue_dir, sub), exist_ok=True)
+
+    manifest.update({'run': run, 'tiles': tiles})
+    writeAtomic(os.path.join(queue_dir, 'manifest.json'), lambda f: f.write(json.dumps(manifest).encode()))
+
+    # The manifest is written first so a worker that finds a tile can always read it
+    for tile in tiles:
+        writeAtomic(os.path.join(queue_dir, 'todo', f'{tile["tile"]}.json'), lambda f: f.write(json.dumps(tile).encode()))
+
+    print(f'   COMPLETE: {len(tiles)} tiles of run {run} written to "{queue_dir}" \n')
+
+    return len(tiles)
+
+def reclaimTiles(queue_dir, lease):
+    '''
+    Moves the claimed tiles whose lease expired back to todo/
+
+    Parameters:
+        queue_dir (string):
+            directory of the queue on the shared filesystem
+        lease (float):
+            seconds since the last heartbeat after which a worker is considered crashed
+
+    Returns:
+        n_reclaimed (integer): number of tiles moved back
+    '''
+    claimed_dir = os.path.join(queue_dir, 'claimed')
+    n_reclaimed = 0
+    for name in [name for name in os.listdir(claimed_dir) if name.endswith('.json')]:
+        path = os.path.join(claimed_dir, name)
+        try:
+            if time.time() - os.stat(path).st_mtime > lease:
+                os.rename(path, os.path.join(queue_dir, 'todo', name))
+                n_reclaimed += 1
+        except FileNotFoundError:
+            # Finished or reclaimed by someone else in the meantime
+            pass
+    return n_reclaimed
+
+def claimTile(queue_dir, lease):
+    '''
+    Claims one tile by renaming it from todo/ to claimed/
+
+    Parameters:
+        queue_dir (string):
+            directory of the queue on the shared filesystem
+        lease (float):
+            seconds since the last heartbeat after which a worker is considered crashed
+
+    Returns:
+        tile (dict): the claimed tile, None if there is nothing left to claim
+    '''
+    reclaimTiles(queue_dir, lease)
+
+    todo_dir = os.path.join(queue_dir, 'todo')
+    # Tiles still being written have a .tmp name
+    for name in sorted(name for name in os.listdir(todo_dir) if name.endswith('.json')):
+        path = os.path.join(todo_dir, name)
+        claimed_path = os.path.join(queue_dir, 'claimed', name)
+        try:
+            # Touches before the rename so the lease starts fresh in claimed/
+            os.utime(path)
+            os.rename(path, claimed_path)
+        except FileNotFoundError:
+            # Another worker won this tile
+            continue
+        with open(claimed_path, 'rb') as f:
+            return json.loads(f.read())
+
+    return None
+
+def runWorker(queue_dir, lease=600, poll=10, block_rows=1000, depth=1):
+    '''
+    Claims and calculates tiles until every tile of the queue is done
+
+    Parameters:
+        queue_dir (string):
+            directory of the queue on the shared filesystem
+        lease (float):
+            seconds since the last heartbeat after which a worker is considered crashed,
+            must be much longer than the calculation of block_rows rows and the clock skew between nodes
+        poll (float):
+            seconds waited before checking again when all remaining tiles are claimed by other workers
+        block_rows (integer):
+            number of reference rows calculated between two heartbeats
+        depth (integer):
+            number of tiles claimed and read ahead in the background while the current tile is calculated
+
+    Returns:
+        n_tiles (integer): number of tiles calculated by this worker
+    '''
+
+    with open(os.path.join(queue_dir, 'manifest.json'), 'rb') as f:
+        manifest = json.loads(f.read())
+    reflat = np.array(manifest['reflat'])
+    deflat = np.array(manifest['deflat'])
+    k = manifest['k']
+    run = manifest['run']
+
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    print(f'Worker {worker} started on run {run} of "{queue_dir}"')
+
+    # Tiles claimed by this worker and not done yet, including the ones read ahead
+    held = []
+
+    def claims():
+        while True:
+            tile = claimTile(queue_dir, lease)
+
+            if tile is None:
+                # Waits for tiles that may be reclaimed from crashed workers
+                if set(os.listdir(os.path.join(queue_dir, 'claimed'))) <= {f'{name}.json' for name in held}:
+                    return
+                time.sleep(poll)
+                continue
+
+            if tile.get('run') != run:
+                # The queue was remade for another run, the tile is given back to the workers of that run
+                try:
+                    os.rename(os.path.join(queue_dir, 'claimed', f'{tile["tile"]}.json'),
+                              os.path.join(queue_dir, 'todo', f'{tile["tile"]}.json'))
+                except FileNotFoundError:
+                    pass
+                print(f'   Worker {worker} stopped: the queue now holds run {tile.get("run")}')
+                return
+
+            held.append(tile['tile'])
+            yield tile
+
+    def heartbeat():
+        # The tile may already have been reclaimed if this worker was too slow
+        for name in list(held):
+            try:
+                os.utime(os.path.join(queue_dir, 'claimed', f'{name}.json'))
+            except FileNotFoundError:
+                pass
+
+    def spec(tile):
+        return (tile['ref_file'], *tile['ref_rows']), (tile['def_file'], *tile['def_rows'])
+
+    # The next tile is claimed and read in the background while the current tile is calculated
+    n_tiles = 0
+    for tile, (P_ref_tile, P_def_tile) in cm.prefetchCorMat(manifest['file_path'], claims(), depth, spec):
+        results = []
+        for r0 in range(0, P_ref_tile.shape[0], block_rows):
+            results.append(dm.tileDist(P_ref_tile[r0:r0 + block_rows], P_def_tile, reflat, deflat, k))
+            results = [dm.mergeDist(results, k)]
+            heartbeat()
+
+        distFunc, U, P_ref, P_def = results[0]
+        frag_path = os.path.join(queue_dir, 'frags', f'{tile["tile"]}.npz')
+        writeAtomic(frag_path, lambda f: np.savez(f, dist=distFunc, U=U, P_ref=P_ref, P_def=P_def, run=run))
+
+        try:
+            os.rename(os.path.join(queue_dir, 'claimed', f'{tile["tile"]}.json'),
+                      os.path.join(queue_dir, 'done', f'{tile["tile"]}.json'))
+        except FileNotFoundError:
+            # Reclaimed meanwhile, the fragment is the same whoever writes it last
+            pass
+        held.remove(tile['tile'])
+
+        n_tiles += 1
+        print(f'   Worker {worker} completed {tile["tile"]}')
+
+    print(f'   COMPLETE: worker {worker} calculated {n_tiles} tiles \n')
+
+    return n_tiles
+
+def reduceQueue(queue_dir):
+    '''
+    Merges the fragments of every tile to the top k min of the whole calculation
+
+    Parameters:
+        queue_dir (string):
+            directory of the queue on the shared filesystem
+
+    Returns:
+        distFunc_stored, U_stored, P_ref_stored, P_def_stored:
+            top k min as returned by distmin.loopDist
+    '''
+
+    with open(os.path.join(queue_dir, 'manifest.json'), 'rb') as f:
+        manifest = json.loads(f.read())
+
+    tiles = [tile['tile'] for tile in manifest['tiles']]
+    missing = [tile for tile in tiles if not os.path.exists(os.path.join(queue_dir, 'frags', f'{tile}.npz'))]
+    if missing:
+        raise RuntimeError(f'{len(missing)} of {len(tiles)} tiles are not done yet, e.g. {missing[:5]}')
+
+    results = []
+    for tile in tiles:
+        with np.load(os.path.join(queue_dir, 'frags', f'{tile}.npz')) as frag:
+            if 'run' not in frag or str(frag['run']) != manifest['run']:
+                raise RuntimeError(f'Fragment of {tile} is not from run {manifest["run"]} of the manifest')
+            results.append((frag['dist'], frag['U'], frag['P_ref'], frag['P_def']))
+    distFunc_stored, U_stored, P_ref_stored, P_def_stored = dm.mergeDist(results, manifest['k'])
+
+    print(f'   Complete: the {manifest["k"]} lowest distance function of {len(tiles)} tiles is')
+    print(' ' * 12, np.array2string(distFunc_stored, prefix=' ' * 12), '\n')
+
+    return distFunc_stored, U_stored, P_ref_stored, P_def_stored
+
+def runLocal(queue_dir, n_workers, lease=600, poll=1):
+    '''
+    Runs several workers as processes on this machine and merges their fragments
+
+    Parameters:
+        queue_dir (string):
+            directory of a queue written by makeQueue
+        n_workers (integer):
+            number of worker processes
+        lease (float):
+            seconds since the last heartbeat after which a worker is considered crashed
+        poll (float):
+            seconds waited before checking again when all remaining tiles are claimed by other workers
+
+    Returns:
+        distFunc_stored, U_stored, P_ref_stored, P_def_stored:
+            top k min as returned by distmin.loopDist
+    '''
+
+    workers = [mp.Process(target=runWorker, args=(queue_dir, lease, poll)) for _ in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    return reduceQueue(queue_dir)
@@ -0,0 +1,49 @@
+import numpy as np
+import argparse as argparse
+
+from module import service as sv
+
+'''
+Input
+'''
+parser = argparse.ArgumentParser(description='Sends a distance minimization request to the solver service')
+parser.add_argument('--socket', default='solver.sock', help='path of the Unix socket (default: ./solver.sock)')
+parser.add_argument('--host', help='host for TCP instead of the Unix socket')
+parser.add_argument('--port', type=int, default=8765, help='port for TCP (default: 8765)')
+parser.add_argument('--status', action='store_true', help='only prints the loaded d of the service')
+parser.add_argument('--abc-ref', type=float, nargs=3, help='unit cell parameter lengths of the reference configuration')
+parser.add_argument('--angle-ref', type=float, nargs=3, help='unit cell parameter angles of the reference configuration')
+parser.add_argument('--abc-def', type=float, nargs=3, help='unit cell parameter lengths of the deformed configuration')
+parser.add_argument('--angle-def', type=float, nargs=3, help='unit cell parameter angles of the deformed configuration')
+parser.add_argument('-p', type=int, default=1, help='number of atoms/molecules in unit cell of the reference phase')
+parser.add_argument('-q', type=int, default=1, help='number of atoms/molecules in unit cell of the deformed phase')
+parser.add_argument('-d', type=int, help='maximum integer of the correspondance matricies (default: largest edge ratio)')
+parser.add_argument('-k', type=int, default=3, help='number of minimum distance functions')
+parser.add_argument('--save', action='store_true', help='appends the result to the results table of the service')
+args = parser.parse_args()
+
+'''
+Calculation
+'''
+address = args.socket if args.host is None else (args.host, args.port)
+
+if args.status:
+    print(sv.sendReq(None, address, path='/status'))
+    raise SystemExit(0)
+
+# Largest edge ratio
+d = args.d
+if d is None:
+    d = round(max([*args.abc_ref, *args.abc_def]) / min([*args.abc_ref, *args.abc_def]))
+
+req = {'abc_ref': args.abc_ref, 'angle_ref': args.angle_ref, 'abc_def': args.abc_def, 'angle_def': args.angle_def,
+       'p': args.p, 'q': args.q, 'd': d, 'k': args.k, 'save': args.save}
+res = sv.sendReq(req, address)
+
+'''
+Output
+'''
+print(f'Solved in {res["runtime"]:.3f} s' + (f', stored with id {res["id"]}' if 'id' in res else ''))
+for key in ['dist', 'U', 'P_ref', 'P_def', 'abc_ref', 'abc_def', 'angle_ref', 'angle_def']:
+    print(f'   {key}')
+    print(' ' * 12, np.array2string(np.array(res[key]), prefix=' ' * 12), '\n')
@@ -0,0 +1,21 @@
+import argparse as argparse
+
+from module import service as sv
+
+'''
+Input
+'''
+parser = argparse.ArgumentParser(description='Runs the distance minimization solver service with the correspondance matricies kept in memory')
+parser.add_argument('--socket', default='solver.sock', help='path of the Unix socket (default: ./solver.sock)')
+parser.add_argument('--host', help='host for TCP instead of the Unix socket')
+parser.add_argument('--port', type=int, default=8765, help='port for TCP (default: 8765)')
+parser.add_argument('--workers', type=int, help='number of requests solved at the same time (default: number of CPUs)')
+parser.add_argument('--preload', type=int, nargs='*', default=[], help='d loaded before the first request')
+parser.add_argument('--k-max', type=int, default=1000, help='largest k of a request (default: 1000)')
+args = parser.parse_args()
+
+'''
+Calculation
+'''
+address = args.socket if args.host is None else (args.host, args.port)
+sv.runServer(address, workers=args.workers, preload=args.preload, k_max=args.k_max)